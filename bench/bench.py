@@ -0,0 +1,450 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   benchmarks of the engine on generated meshes, results are
+#   compared with the stored baseline:
+#
+#       python bench/bench.py --save        stores baseline
+#       python bench/bench.py               reports regressions
+#
+#   the engine runs against the mathutils and bpy stand-ins next to
+#   this file, so results don't depend on the blender build, only
+#   node and split counts, peak memory and output size are compared
+#   unless --times is given, stage times depend on the machine
+#
+
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import numpy
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, ADDON_DIR)
+
+import bpy
+import engine
+from engine import SVGExportPolicy, SVGWriter, SVGMeshData, SVGCurveData, SVGCameraData, SVGObjectData, SVGFrameData
+from engine import bezier_spline
+
+#
+#   the add-on is imported as a package sharing the engine module
+#   with the benchmarks, it reads scenes from the bpy stand-in
+#
+sys.modules["svg_exporter.engine"] = engine
+spec = importlib.util.spec_from_file_location("svg_exporter", os.path.join(ADDON_DIR, "__init__.py"), submodule_search_locations = [ADDON_DIR])
+addon = importlib.util.module_from_spec(spec)
+sys.modules["svg_exporter"] = addon
+spec.loader.exec_module(addon)
+
+#
+#   mesh from vertices and polygons, normals and edges are
+#   calculated the way blender does for planar polygons
+#
+def make_mesh(name, co, polygons):
+    co = numpy.asarray(co, dtype=numpy.float32).astype(numpy.float64)
+    totals = numpy.array([len(p) for p in polygons], dtype=numpy.int32)
+    starts = numpy.concatenate([[0], numpy.cumsum(totals)[:-1]]).astype(numpy.int32)
+    loops = numpy.array([v for p in polygons for v in p], dtype=numpy.int32)
+    normals = numpy.array([numpy.cross(co[p[1]] - co[p[0]], co[p[2]] - co[p[0]]) for p in polygons])
+    normals /= numpy.linalg.norm(normals, axis = 1)[:, None]
+    normals = normals.astype(numpy.float32).astype(numpy.float64)
+    edges = set()
+    for p in polygons:
+        for i in range(len(p)):
+            edges.add(tuple(sorted((p[i], p[(i + 1) % len(p)]))))
+    edges = numpy.array(sorted(edges), dtype=numpy.int32).reshape(-1, 2)
+    return SVGMeshData(name, co, loops, starts, totals, normals, edges)
+
+#
+#   icosahedron subdivided given number of times
+#
+def sphere(name, subdivisions, radius = 1.0):
+    t = (1.0 + math.sqrt(5.0)) / 2.0
+    co = [(-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0), (0, -1, t), (0, 1, t),
+          (0, -1, -t), (0, 1, -t), (t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1)]
+    co = [numpy.array(v, dtype=numpy.float64) / numpy.linalg.norm(v) for v in co]
+    faces = [(0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11), (1, 5, 9), (5, 11, 4),
+             (11, 10, 2), (10, 7, 6), (7, 1, 8), (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8),
+             (3, 8, 9), (4, 9, 5), (2, 4, 11), (6, 2, 10), (8, 6, 7), (9, 8, 1)]
+    for i in range(subdivisions):
+        middle = {}
+        def midpoint(a, b):
+            key = (min(a, b), max(a, b))
+            if key not in middle:
+                v = co[a] + co[b]
+                co.append(v / numpy.linalg.norm(v))
+                middle[key] = len(co) - 1
+            return middle[key]
+        subdivided = []
+        for a, b, c in faces:
+            ab, bc, ca = midpoint(a, b), midpoint(b, c), midpoint(c, a)
+            subdivided += [(a, ab, ca), (b, bc, ab), (c, ca, bc), (ab, bc, ca)]
+        faces = subdivided
+    return make_mesh(name, numpy.array(co) * radius, faces)
+
+#
+#   grid of quads, heights follow a wave so edges have creases
+#
+def grid(name, size, height = 0.0):
+    x, y = numpy.meshgrid(numpy.linspace(-1, 1, size + 1), numpy.linspace(-1, 1, size + 1))
+    z = height * numpy.sin(x * 3 * math.pi) * numpy.cos(y * 2 * math.pi)
+    co = numpy.stack([x.ravel(), y.ravel(), z.ravel()], axis = 1)
+    faces = []
+    for j in range(size):
+        for i in range(size):
+            a = j * (size + 1) + i
+            faces.append((a, a + 1, a + size + 2, a + size + 1))
+    return make_mesh(name, co, faces)
+
+#
+#   box with the given corners
+#
+def box(name, low, high):
+    (x0, y0, z0), (x1, y1, z1) = low, high
+    co = [(x0, y0, z0), (x1, y0, z0), (x1, y1, z0), (x0, y1, z0),
+          (x0, y0, z1), (x1, y0, z1), (x1, y1, z1), (x0, y1, z1)]
+    faces = [(0, 3, 2, 1), (4, 5, 6, 7), (0, 1, 5, 4), (1, 2, 6, 5), (2, 3, 7, 6), (3, 0, 4, 7)]
+    return make_mesh(name, co, faces)
+
+#
+#   world matrix of the object moved to the given place
+#
+def translation(x, y, z):
+    m = numpy.identity(4)
+    m[:3, 3] = (x, y, z)
+    return m
+
+#
+#   camera world matrix looking from eye to target, z is up
+#
+def look_at(eye, target):
+    eye = numpy.asarray(eye, dtype=numpy.float64)
+    z = eye - numpy.asarray(target, dtype=numpy.float64)
+    z /= numpy.linalg.norm(z)
+    x = numpy.cross((0.0, 0.0, 1.0), z)
+    x /= numpy.linalg.norm(x)
+    y = numpy.cross(z, x)
+    m = numpy.identity(4)
+    m[:3, 0], m[:3, 1], m[:3, 2], m[:3, 3] = x, y, z, eye
+    return m
+
+#
+#   flat subdivided ground with towers standing through it
+#
+def plaza_scene(size = 24, towers = 3):
+    ground = numpy.diag((12.0, 12.0, 1.0, 1.0))
+    objects = [SVGObjectData("Plaza", ground, grid("PlazaMesh", size))]
+    for i in range(towers * towers):
+        x, y = (i % towers) * 7.0 - 7.0, (i // towers) * 7.0 - 7.0
+        name = "Tower%d" % i
+        objects.append(SVGObjectData(name, translation(x, y, -1.0), box(name + "Mesh", (-1.3, -1.3, 0.0), (1.3, 1.3, 4.0 + i % 3))))
+    return objects, look_at((-14, -22, 16), (0, 0, 0))
+
+#
+#   spheres standing on a wavy ground
+#
+def spheres_scene(count = 16, subdivisions = 1):
+    objects = []
+    side = int(math.ceil(math.sqrt(count)))
+    for i in range(count):
+        objects.append(SVGObjectData("Sphere%d" % i, translation((i % side) * 2.6 - side, (i // side) * 2.6 - side, 0),
+                                     sphere("SphereMesh%d" % i, subdivisions)))
+    objects.append(SVGObjectData("Ground", translation(0, 0, -1.5), grid("GroundMesh", 12, 0.2)))
+    return objects, look_at((3 * side, -4 * side, 3 * side), (0, 0, 0))
+
+#
+#   building made of floors of rooms, like ex/building.svg
+#
+def building_scene(floors = 4, rooms = 4):
+    objects = []
+    for floor in range(floors):
+        for room in range(rooms):
+            for side in range(2):
+                x, y, z = room * 4.0, side * 5.0, floor * 3.0
+                name = "Room%d_%d_%d" % (floor, room, side)
+                objects.append(SVGObjectData(name, translation(x, y, z), box(name + "Mesh", (0, 0, 0), (3.8, 4.8, 0.2))))
+                objects.append(SVGObjectData(name + "Wall", translation(x, y, z), box(name + "WallMesh", (0, 0, 0.2), (0.2, 4.8, 3.0))))
+        objects.append(SVGObjectData("Slab%d" % floor, translation(-0.5, -0.5, floor * 3.0 - 0.3),
+                                     box("SlabMesh%d" % floor, (0, 0, 0), (rooms * 4.0 + 0.8, 10.8, 0.3))))
+    return objects, look_at((-12, -18, floors * 5.0), (rooms * 2.0, 5, floors * 1.5))
+
+#
+#   site plan of box blocks, camera stands inside and sees a
+#   small part of it
+#
+def site_scene(blocks = 16):
+    objects = []
+    for i in range(blocks):
+        for j in range(blocks):
+            name = "Block%d_%d" % (i, j)
+            objects.append(SVGObjectData(name, translation(i * 6.0, j * 6.0, 0), box(name + "Mesh", (0, 0, 0), (4.0, 4.0, 2.0 + (i * 7 + j * 3) % 5))))
+    objects.append(SVGObjectData("Site", translation(-2, -2, 0), grid("SiteMesh", 32)))
+    objects[-1].matrix[:3, :3] *= blocks * 3.0
+    objects[-1].matrix[:3, 3] = (blocks * 3.0 - 2, blocks * 3.0 - 2, -0.01)
+    return objects, look_at((blocks * 3.0 - 1, -1.0, 1.7), (blocks * 3.0 + 2, 20.0, 1.0))
+
+#
+#   filled bezier rings floating over the building, curves are
+#   subdivided by the perspective camera
+#
+def curves_scene(rings = 8, points = 8):
+    objects, matrix = building_scene()
+    a = numpy.arange(points) * 2 * math.pi / points
+    circle = numpy.stack((numpy.cos(a), numpy.sin(a), numpy.zeros(points)), axis = 1)
+    tangent = numpy.stack((-numpy.sin(a), numpy.cos(a), numpy.zeros(points)), axis = 1) * (4.0 / 3.0 * math.tan(math.pi / (2 * points)))
+    outer = bezier_spline(circle * 2.0, (circle - tangent) * 2.0, (circle + tangent) * 2.0, True)
+    inner = bezier_spline(circle, circle - tangent, circle + tangent, True)
+    for i in range(rings):
+        name = "Ring%d" % i
+        curve = SVGCurveData(name + "Curve", numpy.concatenate((outer, inner)), numpy.array([len(outer), len(inner)]),
+                             numpy.array([True, True]), True)
+        objects.append(SVGObjectData(name, translation((i % 4) * 4.0 + 2.0, (i // 4) * 5.0 + 2.5, 13.0), None, curve))
+    return objects, matrix
+
+#
+#   single finely subdivided sphere for edge detection
+#
+def detail_scene(subdivisions = 4):
+    return [SVGObjectData("Detail", numpy.identity(4), sphere("DetailMesh", subdivisions))], look_at((3, -4, 2), (0, 0, 0))
+
+#
+#   wavy grid with many creases
+#
+def grid_scene(size = 96):
+    return [SVGObjectData("Grid", numpy.identity(4), grid("GridMesh", size, 0.3))], look_at((2, -3, 2), (0, 0, 0))
+
+#
+#   curve with the knots and handles of its bezier splines
+#
+def blender_curve(curve):
+    splines = []
+    starts = numpy.cumsum(curve.counts) - curve.counts
+    for start, count, cyclic in zip(starts.tolist(), curve.counts.tolist(), curve.cyclic.tolist()):
+        co = curve.co[start:start + count]
+        if cyclic:
+            knots = co[:-1:3]
+            left = numpy.roll(co[2::3], 1, axis = 0)
+            right = co[1::3]
+        else:
+            knots = co[::3]
+            left = numpy.concatenate((knots[:1], co[2::3]))
+            right = numpy.concatenate((co[1::3], knots[-1:]))
+        splines.append(bpy.types.Spline('BEZIER', knots, left, right, cyclic))
+    return bpy.types.Curve(curve.name, splines, '2D' if curve.filled else '3D')
+
+#
+#   fills blender context with the objects of the scene, objects
+#   are selected and the camera is the scene camera
+#
+def blender_scene(objects, camera):
+    data = {}
+    selected = []
+    for object in objects:
+        if object.curve != None:
+            if id(object.curve) not in data:
+                data[id(object.curve)] = blender_curve(object.curve)
+            selected.append(bpy.types.Object(object.name, 'CURVE', data[id(object.curve)], object.matrix))
+        elif object.mesh != None:
+            mesh = object.mesh
+            if id(mesh) not in data:
+                data[id(mesh)] = bpy.types.Mesh(mesh.name, mesh.co, mesh.loops, mesh.starts, mesh.totals, mesh.normals, mesh.edges)
+            selected.append(bpy.types.Object(object.name, 'MESH', data[id(mesh)], object.matrix))
+        else:
+            selected.append(bpy.types.Object(object.name, 'EMPTY', None, object.matrix))
+    camera_data = bpy.types.Camera(camera.type, camera.angle_x, camera.clip_start, camera.clip_end, camera.ortho_scale)
+    bpy.context.scene = bpy.Scene(bpy.types.Object(camera.name, 'CAMERA', camera_data, camera.matrix))
+    bpy.context.selected_objects = selected
+    return
+
+#
+#   benchmark cases, name -> (scene, policy options), scenes of the
+#   cases with blender option are copied out of the bpy stand-in by
+#   the add-on, bsp_cache_dir is relative to the temporary directory
+#
+CASES = [
+    ("spheres_balanced", spheres_scene, dict(bsp_splitter = 'BALANCED', bsp_convex = True)),
+    ("spheres_first", spheres_scene, dict(bsp_splitter = 'FIRST', bsp_convex = False)),
+    ("building_bsp", building_scene, dict(bsp_splitter = 'BALANCED', bsp_convex = True)),
+    ("building_view", building_scene, dict(bsp_mode = 'VIEW')),
+    #   tree is compiled in the first run and read from the cache in the rest
+    ("building_cached", building_scene, dict(bsp_cache_dir = "bsp_cache")),
+    ("spheres_view", spheres_scene, dict(bsp_splitter = 'FIRST', bsp_convex = False, bsp_mode = 'VIEW')),
+    ("building_path", building_scene, dict(geometry = 'PATH', styles = 'CLASS', precision = 2)),
+    ("building_occluded", building_scene, dict(occlusion_culling = True)),
+    ("spheres_occluded", spheres_scene, dict(occlusion_culling = True)),
+    ("plaza_bsp", plaza_scene, dict()),
+    ("plaza_merged", plaza_scene, dict(merge_coplanar = True)),
+    ("building_sorted", building_scene, dict(build_bsp = False)),
+    ("building_global", building_scene, dict(build_bsp = False, sort_mode = 'GLOBAL')),
+    ("building_newell", building_scene, dict(build_bsp = False, sort_mode = 'NEWELL')),
+    ("building_curves", curves_scene, dict(curve_tolerance = 0.05)),
+    ("site_culled", site_scene, dict()),
+    ("site_unculled", site_scene, dict(frustum_culling = False)),
+    ("building_lines", building_scene, dict(edge_detection = 'OPT_C')),
+    ("spheres_lines", spheres_scene, dict(edge_detection = 'OPT_C', geometry = 'PATH', precision = 2)),
+    ("detail_edges", detail_scene, dict(build_bsp = False, edge_detection = 'OPT_B')),
+    ("grid_edges", grid_scene, dict(build_bsp = False, edge_detection = 'OPT_B', wireframe = True)),
+    ("spheres_blender", spheres_scene, dict(blender = True)),
+    ("detail_blender", detail_scene, dict(blender = True, build_bsp = False)),
+    ("curves_blender", curves_scene, dict(blender = True, curve_tolerance = 0.05)),
+]
+
+#
+#   exports the scene once, returns measurements
+#
+def run_case(scene, options, path, memory):
+    objects, matrix = scene()
+    options = dict(options)
+    blender = options.pop("blender", False)
+    policy = SVGExportPolicy()
+    policy.file_path = path
+    for key, value in options.items():
+        setattr(policy, key, value)
+    if policy.bsp_cache_dir != "":
+        policy.bsp_cache_dir = os.path.join(os.path.dirname(path), policy.bsp_cache_dir)
+    camera = SVGCameraData("Camera", 'PERSP', 0.8575, 0.1, 500.0, 7.0, matrix)
+    frame = SVGFrameData(1, path, 800, 600, camera, objects)
+
+    #   every run starts without cached mesh properties
+    engine.convex_meshes.clear()
+    engine.mesh_adjacency.clear()
+    if blender:
+        blender_scene(objects, camera)
+        writer = addon.SVGSceneWriter(policy)
+    else:
+        writer = SVGWriter(policy)
+    #   stages are collected without the report
+    writer.profiler.enabled = True
+    writer.profiler.memory = memory
+    writer.profiler.open()
+    if blender:
+        writer.profiler.begin("read")
+        frame = writer.snapshot()[0]
+        writer.profiler.end(faces = sum(len(object.mesh.starts) for object in frame.objects if object.mesh != None),
+                            vertices = sum(len(object.mesh.co) for object in frame.objects if object.mesh != None))
+    writer.export_file(frame)
+    writer.profiler.close()
+
+    result = {"time": {}, "peak_memory": {}, "bytes": os.path.getsize(path), "nodes": 0, "splits": 0}
+    for stage in writer.profiler.stages:
+        result["time"][stage["name"]] = stage["time"]
+        result["peak_memory"][stage["name"]] = stage["peak_memory"]
+    if writer.bsp_compiler != None:
+        result["nodes"] = writer.bsp_compiler.nodes
+        result["splits"] = writer.bsp_compiler.splits
+    return result
+
+#
+#   runs the case several times, the fastest time of every stage
+#   of the last run is taken, caches are warm in the last run,
+#   memory is measured in a separate run because tracing slows
+#   down the stages, the run is the last one so allocations made
+#   once per process are not traced
+#
+def measure(scene, options, repeat, directory):
+    path = os.path.join(directory, "bench.svg")
+    runs = [run_case(scene, options, path, False) for i in range(max(1, repeat))]
+    result = runs[-1]
+    for name in result["time"]:
+        result["time"][name] = min(run["time"][name] for run in runs if name in run["time"])
+    result["peak_memory"] = run_case(scene, options, path, True)["peak_memory"]
+    result["total_time"] = sum(result["time"].values())
+    return result
+
+#
+#   lists metrics that grew more than the threshold, times are
+#   compared only when asked, times below the noise floor are ignored
+#
+def regressions(name, result, baseline, threshold, noise, times = False):
+    found = []
+    def check(metric, value, base, floor):
+        if value > base * (1.0 + threshold) and value - base > floor:
+            found.append("%s %s: %s -> %s (%+.0f%%)" % (name, metric, base, value, 100.0 * (value - base) / max(base, 1e-12)))
+    if times and "time" in baseline:
+        check("total_time", result["total_time"], baseline["total_time"], noise)
+        for stage, value in result["time"].items():
+            if stage in baseline["time"]:
+                check("time." + stage, value, baseline["time"][stage], noise)
+    check("peak_memory", max(result["peak_memory"].values()), max(baseline["peak_memory"].values()), 0)
+    for metric in ("nodes", "splits", "bytes"):
+        check(metric, result[metric], baseline[metric], 0)
+    return found
+
+#
+#   prints table of the results
+#
+def report(results):
+    print("%-18s %9s %9s %9s %9s %9s %9s %9s %8s %8s %10s %10s" % ("case", "total, s", "read", "add", "compile", "project", "hide", "write", "nodes", "splits", "peak, KiB", "bytes"))
+    for name, result in results.items():
+        t = result["time"]
+        print("%-18s %9.3f %9.3f %9.3f %9.3f %9.3f %9.3f %9.3f %8d %8d %10d %10d" % (name, result["total_time"], t.get("read", 0), t.get("add", 0), t.get("compile", 0),
+              t.get("project", 0), t.get("hide", 0), t.get("write", 0), result["nodes"], result["splits"], max(result["peak_memory"].values()) // 1024, result["bytes"]))
+    return
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the SVG exporter engine on generated meshes")
+    parser.add_argument("--case", action = "append", choices = [case[0] for case in CASES], help = "run only given cases")
+    parser.add_argument("--repeat", type = int, default = 3, help = "timed runs of every case")
+    parser.add_argument("--baseline", default = os.path.join(BENCH_DIR, "baseline.json"), help = "baseline file")
+    parser.add_argument("--save", action = "store_true", help = "store results as the baseline")
+    parser.add_argument("--threshold", type = float, default = 0.25, help = "allowed relative growth of the metrics")
+    parser.add_argument("--noise", type = float, default = 0.005, help = "time differences below this number of seconds are ignored")
+    parser.add_argument("--times", action = "store_true", help = "store and compare stage times, baseline must come from the same machine")
+    args = parser.parse_args(argv)
+    logging.getLogger(engine.__name__).setLevel(logging.WARNING)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, scene, options in CASES:
+            if args.case == None or name in args.case:
+                results[name] = measure(scene, options, args.repeat, directory)
+    report(results)
+
+    if args.save:
+        if not args.times:
+            results = dict((name, dict((key, value) for key, value in result.items() if key not in ("time", "total_time")))
+                           for name, result in results.items())
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"cases": results}, f, indent = 2, sort_keys = True)
+        print("Baseline saved to %s" % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline %s, run with --save to store one" % args.baseline)
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)["cases"]
+    found = []
+    for name, result in results.items():
+        if name in baseline:
+            found += regressions(name, result, baseline[name], args.threshold, args.noise, args.times)
+    for line in found:
+        print("REGRESSION " + line)
+    if len(found) == 0:
+        print("No regressions against %s" % args.baseline)
+    return 1 if len(found) != 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
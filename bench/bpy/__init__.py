@@ -0,0 +1,87 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   stand-in for the part of blender 2.6 bpy used by the add-on,
+#   the benchmarks fill the context with generated scenes, so the
+#   data is copied out of blender the way the exporter does it
+#
+
+import os
+
+from . import props
+from . import types
+
+class Render:
+
+    def __init__(self, resolution_x = 800, resolution_y = 600):
+        self.resolution_x = resolution_x
+        self.resolution_y = resolution_y
+
+class Scene:
+
+    def __init__(self, camera = None):
+        self.render = Render()
+        self.camera = camera
+        self.frame_current = 1
+        self.frame_start = 1
+        self.frame_end = 1
+        self.frame_step = 1
+
+    def frame_set(self, number):
+        self.frame_current = number
+        return
+
+class Context:
+
+    def __init__(self):
+        self.scene = Scene()
+        self.selected_objects = []
+
+context = Context()
+
+#
+#   operators are not run, calls of any operator are ignored
+#
+class Operators:
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return {'CANCELLED'}
+
+ops = Operators()
+
+class utils:
+
+    @staticmethod
+    def register_class(cls):
+        return
+
+    @staticmethod
+    def unregister_class(cls):
+        return
+
+class path:
+
+    #   blender paths starting with // are relative to the blend file
+    @staticmethod
+    def abspath(name):
+        if name.startswith("//"):
+            name = name[2:]
+        return os.path.abspath(name)
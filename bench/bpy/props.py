@@ -0,0 +1,36 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   operator properties are plain class attributes holding their
+#   default values
+#
+
+def BoolProperty(default = False, **options):
+    return default
+
+def EnumProperty(items = (), default = None, **options):
+    return default if default != None else items[0][0]
+
+def FloatProperty(default = 0.0, **options):
+    return default
+
+def IntProperty(default = 0, **options):
+    return default
+
+def StringProperty(default = "", **options):
+    return default
@@ -0,0 +1,100 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   blender data the exporter reads, properties of the collections
+#   are kept in arrays and copied out with foreach_get
+#
+
+import numpy
+
+class Operator:
+    pass
+
+#   menu the exporter adds itself to
+INFO_MT_file_export = []
+
+#
+#   collection of items with array properties, values of the items
+#   are flat in the arrays
+#
+class bpy_prop_collection:
+
+    def __init__(self, length, **arrays):
+        self.length = length
+        self.arrays = arrays
+
+    def __len__(self):
+        return self.length
+
+    def foreach_get(self, name, values):
+        data = numpy.asarray(self.arrays[name]).ravel()
+        if len(values) != len(data):
+            raise TypeError("foreach_get(attr, sequence) sequence length mismatch given %d, needed %d" % (len(values), len(data)))
+        values[:] = data
+        return
+
+class Mesh:
+
+    def __init__(self, name, co, loops, starts, totals, normals, edges):
+        self.name = name
+        self.vertices = bpy_prop_collection(len(co), co = co)
+        self.loops = bpy_prop_collection(len(loops), vertex_index = loops)
+        self.polygons = bpy_prop_collection(len(starts), loop_start = starts, loop_total = totals, normal = normals)
+        self.edges = bpy_prop_collection(len(edges), vertices = edges)
+
+#
+#   bezier splines have points with handles, poly and nurbs splines
+#   have points with weights
+#
+class Spline:
+
+    def __init__(self, type, co, handle_left = None, handle_right = None, use_cyclic_u = False):
+        self.type = type
+        self.use_cyclic_u = use_cyclic_u
+        self.bezier_points = bpy_prop_collection(0)
+        self.points = bpy_prop_collection(0)
+        if type == 'BEZIER':
+            self.bezier_points = bpy_prop_collection(len(co), co = co, handle_left = handle_left, handle_right = handle_right)
+        else:
+            weights = numpy.ones((len(co), 1))
+            self.points = bpy_prop_collection(len(co), co = numpy.concatenate((co, weights), axis = 1))
+
+class Curve:
+
+    def __init__(self, name, splines, dimensions = '3D', fill_mode = 'FULL'):
+        self.name = name
+        self.splines = splines
+        self.dimensions = dimensions
+        self.fill_mode = fill_mode
+
+class Camera:
+
+    def __init__(self, type, angle_x, clip_start, clip_end, ortho_scale):
+        self.type = type
+        self.angle_x = angle_x
+        self.clip_start = clip_start
+        self.clip_end = clip_end
+        self.ortho_scale = ortho_scale
+
+class Object:
+
+    def __init__(self, name, type, data, matrix_world):
+        self.name = name
+        self.type = type
+        self.data = data
+        self.matrix_world = matrix_world
@@ -0,0 +1,160 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   stand-in for the part of blender 2.6 mathutils used by the
+#   engine, "*" is matrix product for matrices and dot product
+#   for vectors as in blender 2.6
+#
+
+import math
+import numpy
+
+class Vector:
+
+    def __init__(self, seq = (0.0, 0.0, 0.0)):
+        self.v = [float(x) for x in seq]
+
+    def __len__(self):
+        return len(self.v)
+
+    def __getitem__(self, i):
+        return self.v[i]
+
+    def __setitem__(self, i, x):
+        self.v[i] = float(x)
+
+    def __iter__(self):
+        return iter(self.v)
+
+    def __repr__(self):
+        return "Vector(%r)" % (tuple(self.v),)
+
+    def __add__(self, other):
+        return Vector([a + b for a, b in zip(self.v, other)])
+
+    def __sub__(self, other):
+        return Vector([a - b for a, b in zip(self.v, other)])
+
+    def __neg__(self):
+        return Vector([-a for a in self.v])
+
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            return sum(a * b for a, b in zip(self.v, other.v))
+        if isinstance(other, Matrix):
+            return NotImplemented
+        return Vector([a * other for a in self.v])
+
+    def __rmul__(self, other):
+        return Vector([a * other for a in self.v])
+
+    def __truediv__(self, other):
+        return Vector([a / other for a in self.v])
+
+    def __itruediv__(self, other):
+        self.v = [a / other for a in self.v]
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, Vector) and self.v == other.v
+
+    def __hash__(self):
+        return hash(tuple(self.v))
+
+    @property
+    def length(self):
+        return math.sqrt(sum(a * a for a in self.v))
+
+    def normalize(self):
+        length = self.length
+        if length != 0:
+            self.v = [a / length for a in self.v]
+        return
+
+    def normalized(self):
+        v = Vector(self.v)
+        v.normalize()
+        return v
+
+    def cross(self, other):
+        a, b = self.v, other.v
+        return Vector((a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]))
+
+    def dot(self, other):
+        return self * other
+
+    def copy(self):
+        return Vector(self.v)
+
+    def to_tuple(self):
+        return tuple(self.v)
+
+class Matrix:
+
+    def __init__(self, rows = None):
+        if rows is None:
+            self.m = numpy.identity(4)
+        else:
+            self.m = numpy.array([list(row) for row in rows], dtype=numpy.float64)
+
+    def __len__(self):
+        return len(self.m)
+
+    def __getitem__(self, i):
+        return self.m[i]
+
+    def __iter__(self):
+        return iter(self.m)
+
+    def __array__(self, dtype = None, copy = None):
+        return numpy.array(self.m, dtype=dtype)
+
+    def __repr__(self):
+        return "Matrix(%r)" % (self.m.tolist(),)
+
+    #   vector of smaller size is extended by 1 as in blender
+    def __mul__(self, other):
+        if isinstance(other, Matrix):
+            return Matrix(numpy.dot(self.m, other.m))
+        if isinstance(other, Vector):
+            n = len(self.m)
+            if len(other) == n - 1:
+                return Vector(numpy.dot(self.m, numpy.array(other.v + [1.0]))[:n - 1])
+            return Vector(numpy.dot(self.m, numpy.array(other.v)))
+        return Matrix(self.m * other)
+
+    def inverted(self):
+        return Matrix(numpy.linalg.inv(self.m))
+
+    def transposed(self):
+        return Matrix(self.m.T)
+
+    def to_3x3(self):
+        return Matrix(self.m[:3, :3])
+
+    def to_translation(self):
+        return Vector(self.m[:3, 3])
+
+    def copy(self):
+        return Matrix(self.m)
+
+    @staticmethod
+    def Translation(v):
+        m = Matrix()
+        m.m[:3, 3] = list(v)
+        return m
@@ -0,0 +1,3640 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   engine of the exporter, projects meshes and writes svg files,
+#   blender is not used here, so scene snapshots written by the
+#   exporter can be rendered from the command line:
+#
+#       python engine.py scene.npz scene.svg
+#
+
+import argparse
+import math
+import mathutils
+import mathutils.geometry
+import bisect
+import collections
+import copy
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+import zipfile
+import numpy
+
+from copy import deepcopy
+from mathutils import Matrix, Vector
+from math import tan, atan, acos, cos, pi
+
+#   exporter log, nothing is printed unless level is raised
+log = logging.getLogger(__name__)
+
+def make_view_matrix(eye, target, up):
+    zAxis = eye - target
+    zAxis.normalize()
+    xAxis = up.cross(zAxis)
+    xAxis.normalize()
+    yAxis = zAxis.cross(xAxis)
+    yAxis.normalize()
+
+    m = Matrix()
+
+    m[0][0] = xAxis[0]
+    m[1][0] = xAxis[1]
+    m[2][0] = xAxis[2]
+    m[3][0] = -eye.dot(xAxis)
+
+    m[0][1] = yAxis[0]
+    m[1][1] = yAxis[1]
+    m[2][1] = yAxis[2]
+    m[3][1] = -eye.dot(yAxis)
+
+    m[0][2] = zAxis[0]
+    m[1][2] = zAxis[1]
+    m[2][2] = zAxis[2]
+    m[3][2] = -eye.dot(zAxis)
+
+    m[0][3] = 0.0
+    m[1][3] = 0.0
+    m[2][3] = 0.0
+    m[3][3] = 1.0
+    
+    return m
+
+#   
+#   calculates typical perspective projection matrix
+#   based on camera field of view, aspect ratio and
+#   near and far clipping planes
+#
+def make_projection_matrix(fovx, aspect, znear, zfar):
+    e = 1.0 / tan(fovx / 2.0)
+    fovy = 2.0 * atan(aspect / e)
+    xScale = 1.0 / tan(0.5 * fovy)
+    yScale = xScale * aspect
+    
+    m = Matrix()
+    
+    m[0][0] = xScale
+    m[0][1] = 0.0
+    m[0][2] = 0.0
+    m[0][3] = 0.0
+    
+    m[1][0] = 0.0;
+    m[1][1] = yScale
+    m[1][2] = 0.0
+    m[1][3] = 0.0
+    
+    m[2][0] = 0.0
+    m[2][1] = 0.0
+    m[2][2] = (zfar + znear) / (znear - zfar)
+    m[2][3] = -1.0
+    
+    m[3][0] = 0.0
+    m[3][1] = 0.0
+    m[3][2] = (2.0 * zfar * znear) / (znear - zfar)
+    m[3][3] = 0.0
+    
+    return m
+
+#   
+#   calculates typical perspective projection matrix
+#   based on camera field of view, aspect ratio and
+#   near and far clipping planes
+#
+def make_ortho_projection_matrix(width, height, near, far, scale):
+    left = 1*scale
+    right = -1*scale
+    top = -1*height/width*scale
+    bottom = 1*height/width*scale
+        
+    m = Matrix()
+    
+    m[0][0] = 2/(right - left)
+    m[0][1] = 0.0
+    m[0][2] = 0.0
+    m[0][3] = -(right+left)/(right-left)
+    
+    m[1][0] = 0.0;
+    m[1][1] = 2/(top - bottom)
+    m[1][2] = 0.0
+    m[1][3] = -(top+bottom)/(top-bottom)
+    
+    m[2][0] = 0.0
+    m[2][1] = 0.0
+    m[2][2] = -2/(far - near)
+    m[2][3] = -(far+near)/(far-near)
+    
+    m[3][0] = 0.0
+    m[3][1] = 0.0
+    m[3][2] = 0
+    m[3][3] = 1
+    
+    return m
+
+#
+#   projects (N, 3) array of points on the screen using
+#   combined 4x4 matrix, returns (N, 3) array of screen
+#   coordinates that can be indexed by vertex index
+#
+def project_points(matrix, points, width, height):
+    m = numpy.array(matrix, dtype=numpy.float64)
+    p = numpy.dot(points, m[:3, :3].T) + m[:3, 3]
+    p /= p[:, 2:3]
+
+    #   scale and centralise
+    p[:, 0] = width / 2 + p[:, 0] / 2 * width
+    p[:, 1] = height / 2 - p[:, 1] / 2 * height
+    return p
+
+#
+#   mesh geometry copied out of blender into plain arrays,
+#   it can be pickled and sent to the worker processes or
+#   written to the snapshot
+#
+class SVGMeshData:
+    
+    def __init__(self, name, co, loops, starts, totals, normals, edges):
+        self.name = name
+        #   (N, 3) vertex coordinates
+        self.co = co
+        #   vertex indices of all polygons, one after another
+        self.loops = loops
+        #   first loop and number of loops of every polygon
+        self.starts = starts
+        self.totals = totals
+        #   (F, 3) polygon normals
+        self.normals = normals
+        #   (E, 2) vertex indices of the edges
+        self.edges = edges
+        #   polygons with the same loops can be split differently and
+        #   loose edges are not in the loops
+        self.signature = (len(starts), hash(co.tobytes()), hash(loops.tobytes()), hash(totals.tobytes()), hash(edges.tobytes()))
+        return
+    
+    #
+    #   yields vertex indices and normal of every polygon
+    #
+    def polygons(self):
+        loops = self.loops.tolist()
+        for start, total, normal in zip(self.starts.tolist(), self.totals.tolist(), self.normals.tolist()):
+            yield (loops[start:start + total], Vector(normal))
+        return
+
+#
+#   curve geometry copied out of blender, every spline is a chain
+#   of cubic segments sharing end points, segment i of the spline
+#   uses its control points 3i..3i+3, cyclic splines end with
+#   their first point
+#
+class SVGCurveData:
+    
+    def __init__(self, name, co, counts, cyclic, filled):
+        self.name = name
+        #   (N, 3) control points of all splines, one after another
+        self.co = co
+        #   number of control points and closed flag of every spline
+        self.counts = counts
+        self.cyclic = cyclic
+        #   closed splines are filled, holes are made by the even-odd rule
+        self.filled = filled
+        self.signature = (len(counts), hash(co.tobytes()), hash(numpy.asarray(counts, dtype=numpy.int64).tobytes()),
+                          hash(numpy.asarray(cyclic, dtype=bool).tobytes()), bool(filled))
+        return
+
+#
+#   control points of the bezier spline from its knots and handles
+#
+def bezier_spline(knots, left, right, cyclic):
+    points = numpy.stack((left, knots, right), axis = 1).reshape(-1, 3)
+    if cyclic:
+        return numpy.concatenate((points[1:], points[:2]))
+    return points[1:-1]
+
+#
+#   control points of the spline made of straight segments, handles
+#   lie at the thirds of the segments so the curve is exact
+#
+def poly_spline(knots, cyclic):
+    if cyclic:
+        knots = numpy.concatenate((knots, knots[:1]))
+    a = knots[:-1]
+    b = knots[1:]
+    points = numpy.stack((a, a + (b - a) / 3.0, b - (b - a) / 3.0), axis = 1).reshape(-1, 3)
+    return numpy.concatenate((points, knots[-1:]))
+
+#
+#   values computed from the meshes, kept by mesh name until the
+#   mesh data changes, least recently used values are dropped when
+#   total weight of the values exceeds the limit
+#
+class SVGMeshCache:
+    
+    def __init__(self, limit):
+        self.limit = limit
+        #   mesh name -> (signature, value, weight)
+        self.items = collections.OrderedDict()
+        self.weight = 0
+        return
+    
+    def get(self, mesh):
+        item = self.items.get(mesh.name)
+        if item == None or item[0] != mesh.signature:
+            return None
+        self.items.move_to_end(mesh.name)
+        return item[1]
+    
+    def put(self, mesh, value, weight = 1):
+        self.discard(mesh.name)
+        self.items[mesh.name] = (mesh.signature, value, weight)
+        self.weight += weight
+        while self.weight > self.limit and len(self.items) > 1:
+            self.discard(next(iter(self.items)))
+        return
+    
+    def discard(self, name):
+        item = self.items.pop(name, None)
+        if item != None:
+            self.weight -= item[2]
+        return
+    
+    def clear(self):
+        self.items.clear()
+        self.weight = 0
+        return
+
+#
+#   convexity flags of the meshes
+#
+convex_meshes = SVGMeshCache(4096)
+
+#
+#   checks that the mesh is a closed surface of one piece and every
+#   face has the faces around it behind its plane, such surface is
+#   convex, faces are tested only against their neighbours
+#
+def mesh_is_convex(mesh):
+    cached = convex_meshes.get(mesh)
+    if cached != None:
+        return cached
+    
+    #   every edge has two faces and V - E + F = 2 of a sphere, surfaces
+    #   of several pieces or pieces touching at a vertex give more
+    adjacency = edge_adjacency(mesh)
+    convex = len(mesh.starts) != 0 and bool((adjacency.face_count == 2).all()) and \
+             len(numpy.unique(mesh.loops)) - len(adjacency.edges) + len(mesh.starts) == 2
+    
+    if convex:
+        co = mesh.co
+        normals = mesh.normals
+        offsets = (normals * co[mesh.loops[mesh.starts]]).sum(axis = 1)
+        eps = 0.0001 * max(1.0, numpy.ptp(co, axis = 0).max())
+        #   vertices of both faces of every edge by the plane of the other face
+        a = adjacency.loop_face[adjacency.order[adjacency.first]]
+        b = adjacency.loop_face[adjacency.order[adjacency.first + 1]]
+        faces = numpy.concatenate((a, b))
+        planes = numpy.concatenate((b, a))
+        totals = mesh.totals[faces]
+        starts = numpy.cumsum(totals) - totals
+        loops = numpy.repeat(mesh.starts[faces] - starts, totals) + numpy.arange(int(totals.sum()))
+        planes = numpy.repeat(planes, totals)
+        values = (co[mesh.loops[loops]] * normals[planes]).sum(axis = 1) - offsets[planes]
+        convex = not (values > eps).any()
+    
+    convex_meshes.put(mesh, convex)
+    return convex
+
+#
+#   edge-face adjacency of the meshes, weight is the number of loops
+#
+mesh_adjacency = SVGMeshCache(1 << 22)
+
+#
+#   edges of the mesh and faces sharing them as index arrays,
+#   every loop of every polygon refers to its edge, cosines of
+#   the angles between faces are calculated once per mesh
+#
+class SVGEdgeAdjacency:
+    
+    def __init__(self, mesh):
+        #   face of every loop and loop following it in the face
+        self.loop_face = numpy.repeat(numpy.arange(len(mesh.starts)), mesh.totals)
+        following = numpy.arange(1, len(mesh.loops) + 1)
+        following[mesh.starts + mesh.totals - 1] = mesh.starts
+        a = mesh.loops
+        b = mesh.loops[following]
+        #   vertex pairs are sorted as single numbers
+        count = max(1, len(mesh.co))
+        keys = numpy.minimum(a, b).astype(numpy.int64) * count + numpy.maximum(a, b)
+        keys, self.loop_edge = numpy.unique(keys, return_inverse = True)
+        #   (E, 2) sorted vertex indices of the edges, edge of every loop
+        self.edges = numpy.stack([keys // count, keys % count], axis = 1)
+        self.loop_edge = self.loop_edge.ravel()
+        #   loops sorted by edge, loops of the edge start at first[edge]
+        self.face_count = numpy.bincount(self.loop_edge, minlength = len(self.edges))
+        self.order = numpy.argsort(self.loop_edge, kind = 'stable')
+        self.first = numpy.cumsum(self.face_count) - self.face_count
+        #   cosine of the angle between faces of the edges shared by two faces
+        self.normals = mesh.normals
+        self.cosines = numpy.full(len(self.edges), numpy.nan)
+        manifold = numpy.flatnonzero(self.face_count == 2)
+        f0 = self.loop_face[self.order[self.first[manifold]]]
+        f1 = self.loop_face[self.order[self.first[manifold] + 1]]
+        self.cosines[manifold] = (self.normals[f0] * self.normals[f1]).sum(axis = 1)
+        return
+    
+    #
+    #   returns mask of visible edges, edges of a single front face
+    #   and edges of two front faces meeting at angle larger than
+    #   max_value degrees
+    #
+    def feature_edges(self, front, max_value):
+        loop_front = front[self.loop_face]
+        front_count = numpy.bincount(self.loop_edge, weights = loop_front, minlength = len(self.edges))
+        limit = cos(max_value/180*pi)
+        visible = (front_count == 1) | ((front_count == 2) & (self.face_count == 2) & (self.cosines < limit))
+        
+        #   edges of more than two faces, two of them in front
+        for edge in numpy.flatnonzero((front_count == 2) & (self.face_count > 2)).tolist():
+            loops = self.order[self.first[edge]:self.first[edge] + self.face_count[edge]]
+            faces = self.loop_face[loops[loop_front[loops]]]
+            visible[edge] = numpy.dot(self.normals[faces[0]], self.normals[faces[1]]) < limit
+            
+        if log.isEnabledFor(logging.DEBUG):
+            for edge in numpy.flatnonzero(front_count > 2).tolist():
+                log.debug("Ignoring edge %s shared by %d front faces", tuple(self.edges[edge].tolist()), front_count[edge])
+        return visible
+
+#
+#   returns adjacency of the mesh, it is built again only when
+#   the mesh changes
+#
+def edge_adjacency(mesh):
+    adjacency = mesh_adjacency.get(mesh)
+    if adjacency != None:
+        return adjacency
+    adjacency = SVGEdgeAdjacency(mesh)
+    mesh_adjacency.put(mesh, adjacency, len(mesh.loops))
+    return adjacency
+
+class SVGFace:
+    __slots__ = ("vertices", "normal", "visible_edges", "distance")
+    
+    #
+    #   polygon is either face to take the plane from, or
+    #   list of vertex indices, edges of the face are taken
+    #   from the mesh adjacency
+    #
+    def __init__(self, polygon, normal = None):
+        if type(polygon) == SVGFace:
+            self.vertices = []
+            self.normal = polygon.normal
+            self.visible_edges = []
+            self.distance = polygon.distance
+        else:
+            self.vertices = polygon
+            self.normal = normal
+            self.visible_edges = set()
+            self.distance = 0
+        return
+
+#
+#   shape passed through the export pipeline, open polylines have
+#   no fill colour, face is the bsp face the polygon comes from
+#
+class SVGPrimitive:
+    __slots__ = ("points", "closed", "fill_color", "border_color", "face", "cubic")
+    
+    def __init__(self, points, closed = True, fill_color = None, border_color = (0, 0, 0), face = None, cubic = False):
+        self.points = points
+        self.closed = closed
+        self.fill_color = fill_color
+        self.border_color = border_color
+        self.face = face
+        #   points are (points, cyclic) splines of cubic segments,
+        #   closed curve is filled
+        self.cubic = cubic
+        return
+                   
+#
+#   
+#
+class SVGMesh:
+    def __init__(self, mesh):
+        self.projected_vertices = numpy.empty((0, 3))
+        self.vertices = mesh.co
+        self.normals = mesh.normals
+        self.loops = mesh.loops
+        self.starts = mesh.starts
+        self.totals = mesh.totals
+        self.edges = mesh.edges
+        self.front_faces = []
+        #   numpy copies of the matrices and their products, "*" of
+        #   mathutils is not the matrix product in every version
+        self.proj = numpy.identity(4)
+        self.view = numpy.identity(4)
+        self.world = numpy.identity(4)
+        self.model_view = numpy.identity(4)
+        self.matrix = numpy.identity(4)
+        self.width = 0
+        self.height = 0
+        self.plane_values = None
+        
+        #   faces in the order of the mesh, faces are sorted later
+        self.polygons = [SVGFace(vertices, normal) for vertices, normal in mesh.polygons()]
+        self.faces = list(self.polygons)
+        #   mesh indices of the faces in drawing order and front face flags
+        self.order = numpy.arange(len(self.polygons))
+        self.front = numpy.zeros(len(self.polygons), dtype=bool)
+        self.adjacency = edge_adjacency(mesh)
+        return
+    
+    #
+    #   planes are view space planes faces and edges are clipped by,
+    #   see SVGFrustum.near_planes
+    #
+    def project_vertices(self, proj, view, world, width, height, planes = None):
+        self.proj = numpy.array(proj, dtype=numpy.float64)
+        self.view = numpy.array(view, dtype=numpy.float64)
+        self.world = numpy.array(world, dtype=numpy.float64)
+        self.model_view = numpy.dot(self.view, self.world)
+        self.matrix = numpy.dot(self.proj, self.model_view)
+        self.width = width
+        self.height = height
+        self.projected_vertices = project_points(self.matrix, self.vertices, width, height)
+        #   plane values of the vertices when the mesh crosses the planes
+        self.plane_values = None
+        if planes is not None:
+            values = plane_values(numpy.dot(planes, self.model_view), self.vertices)
+            if (values < 0).any():
+                self.plane_values = values
+        return
+    
+    #
+    #   projected polygon of the vertices, part behind the planes is
+    #   clipped, polygon behind them has no points
+    #
+    def polygon_points(self, vertices):
+        if self.plane_values is None:
+            return self.projected_vertices[vertices]
+        values = self.plane_values[vertices]
+        if (values >= 0).all():
+            return self.projected_vertices[vertices]
+        points = clip_polygon(self.vertices[vertices], values)
+        if len(points) == 0:
+            return points
+        return project_points(self.matrix, points, self.width, self.height)
+    
+    #
+    #   projected (2, 3) segments of the (E, 2) edges, parts behind
+    #   the planes are clipped
+    #
+    def edge_points(self, edges):
+        if self.plane_values is None:
+            return list(self.projected_vertices[edges])
+        edges = numpy.asarray(edges).reshape(-1, 2)
+        segments = clip_segments(self.vertices[edges], self.plane_values[edges])
+        points = project_points(self.matrix, segments.reshape(-1, 3), self.width, self.height)
+        return list(points.reshape(-1, 2, 3))
+        
+    #
+    #   faces are sorted from far to near by the distances from the
+    #   camera to their centres, equal faces keep mesh order
+    #
+    def sort_faces(self):
+        depths = self.face_depths(self.view_vertices(), numpy.arange(len(self.polygons)))
+        self.order = numpy.argsort(-depths, kind = 'stable')
+        self.faces = [self.polygons[i] for i in self.order.tolist()]
+        return
+    
+    #
+    #   vertices transformed to the view space at once
+    #
+    def view_vertices(self):
+        m = self.model_view
+        return numpy.dot(self.vertices, m[:3, :3].T) + m[:3, 3]
+    
+    #
+    #   loop indices of the faces one after other and offsets of
+    #   the first loop of every face among them
+    #
+    def face_loops(self, faces):
+        totals = self.totals[faces]
+        offsets = numpy.cumsum(totals) - totals
+        loops = numpy.repeat(self.starts[faces] - offsets, totals) + numpy.arange(int(totals.sum()))
+        return (self.loops[loops], offsets)
+    
+    #
+    #   distances from the camera to the centres of the faces
+    #
+    def face_depths(self, view_vertices, faces):
+        if len(faces) == 0:
+            return numpy.empty(0)
+        loops, offsets = self.face_loops(faces)
+        centres = numpy.add.reduceat(view_vertices[loops], offsets) / self.totals[faces][:, None]
+        return numpy.sqrt((centres * centres).sum(axis = 1))
+    
+    #
+    #   faces with view space normals pointing to the camera, all
+    #   normals are transformed at once
+    #
+    def calc_front_faces(self):        
+        #   get normal transform matrix
+        normal_matrix = numpy.linalg.inv(self.model_view[:3, :3]).T
+        
+        log.debug("Normal matrix: %s", normal_matrix)
+        
+        #   camera looks along -z
+        self.front = numpy.dot(self.normals, normal_matrix[2]) > 0
+        self.front_faces = [self.polygons[i] for i in self.order[self.front[self.order]].tolist()]
+        return self.front_faces
+    
+    def project_faces(self, faces):
+        result = []
+        for face in faces:
+            result.append(self.projected_vertices[face.vertices])
+        return result
+    
+    def all_faces(self):
+        result = []    
+        for face in self.faces:                      
+            result.append(self.projected_vertices[face.vertices])
+        return result   
+    
+    def all_edges(self, max_value):
+        log.debug("Front faces to check: %d", len(self.front_faces))
+        front = self.front
+        
+        adjacency = self.adjacency
+        visible = adjacency.feature_edges(front, max_value)
+        log.debug("Edges count detected: %d", numpy.count_nonzero(visible))
+        
+        #   front faces draw their visible edges
+        edges = adjacency.edges.tolist()
+        loop_edge = adjacency.loop_edge.tolist()
+        loop_face = adjacency.loop_face.tolist()
+        for loop in numpy.flatnonzero(visible[adjacency.loop_edge] & front[adjacency.loop_face]).tolist():
+            self.polygons[loop_face[loop]].visible_edges.add(tuple(edges[loop_edge[loop]]))
+        
+        #   convert edges to projected points
+        return self.edge_points(adjacency.edges[visible])
+    
+    def calculate_edges(self):
+        return 
+    
+#
+#   painter's sort of the faces of several meshes, faces are
+#   ordered from far to near by the distances to their centres
+#   with one argsort, then overlapping faces can be reordered by
+#   the plane tests of Newell's algorithm, faces are not split so
+#   cyclic overlaps keep the order of the distances
+#
+class SVGDepthSort:
+    
+    def __init__(self, perspective = True):
+        self.perspective = perspective
+        #   meshes and polygon indices of their faces
+        self.meshes = []
+        self.faces = []
+        #   arrays of the faces of every mesh, depth is the distance
+        #   along the view direction, bounds are screen rectangles
+        self.depths = []
+        self.near = []
+        self.far = []
+        self.low = []
+        self.high = []
+        #   view space planes and vertices of the faces
+        self.normals = []
+        self.distances = []
+        self.points = []
+        self.totals = []
+        #   number of faces taken out of distance order by the last refinement
+        self.moved_count = 0
+        return
+    
+    #
+    #   adds faces of the projected mesh, faces are polygon indices
+    #
+    def add(self, svg_mesh, faces):
+        faces = numpy.asarray(faces, dtype=numpy.int64)
+        crossing = None
+        if svg_mesh.plane_values is not None and len(faces) != 0:
+            #   faces behind the eye are dropped, screen bounds of the
+            #   faces crossing its planes are unknown until they are clipped
+            loops, offsets = svg_mesh.face_loops(faces)
+            values = svg_mesh.plane_values[loops]
+            behind = (numpy.maximum.reduceat(values, offsets) < 0).any(axis = 1)
+            crossing = (numpy.minimum.reduceat(values, offsets) < 0).any(axis = 1)[~behind]
+            faces = faces[~behind]
+        if len(faces) == 0:
+            return
+        view_vertices = svg_mesh.view_vertices()
+        loops, offsets = svg_mesh.face_loops(faces)
+        points = view_vertices[loops]
+        screen = svg_mesh.projected_vertices[loops][:, :2]
+        normal_matrix = numpy.linalg.inv(svg_mesh.model_view[:3, :3]).T
+        normals = numpy.dot(svg_mesh.normals[faces], normal_matrix.T)
+        normals /= numpy.maximum(numpy.sqrt((normals * normals).sum(axis = 1)), 1e-12)[:, None]
+        
+        self.meshes.append(svg_mesh)
+        self.faces.append(faces)
+        self.depths.append(svg_mesh.face_depths(view_vertices, faces))
+        #   camera looks along -z
+        self.near.append(numpy.minimum.reduceat(-points[:, 2], offsets))
+        self.far.append(numpy.maximum.reduceat(-points[:, 2], offsets))
+        low = numpy.minimum.reduceat(screen, offsets)
+        high = numpy.maximum.reduceat(screen, offsets)
+        if crossing is not None:
+            low[crossing] = -numpy.inf
+            high[crossing] = numpy.inf
+        self.low.append(low)
+        self.high.append(high)
+        self.normals.append(normals)
+        self.distances.append(-(normals * points[offsets]).sum(axis = 1))
+        self.points.append(points)
+        self.totals.append(svg_mesh.totals[faces])
+        return
+    
+    #
+    #   returns mesh numbers and polygon indices of all faces in
+    #   the drawing order
+    #
+    def sort(self, refine = False):
+        if len(self.meshes) == 0:
+            return []
+        meshes = numpy.repeat(numpy.arange(len(self.meshes)), [len(faces) for faces in self.faces])
+        faces = numpy.concatenate(self.faces)
+        order = numpy.argsort(-numpy.concatenate(self.depths), kind = 'stable')
+        if refine:
+            order = self.refine(order)
+        self.order = order
+        return list(zip(meshes[order].tolist(), faces[order].tolist()))
+    
+    #
+    #   depths of the faces in the drawing order of the last sort
+    #
+    def sorted_depths(self):
+        if len(self.meshes) == 0:
+            return numpy.empty(0)
+        return numpy.concatenate(self.depths)[self.order]
+    
+    #
+    #   reorders faces overlapping on the screen by the plane tests
+    #   of Newell's algorithm, face p must be drawn before face q
+    #   when p is behind the plane of q or q is in front of the plane
+    #   of p and the reversed tests fail, faces overlapping only on
+    #   the screen keep far to near order, faces are then taken in
+    #   the order of the distances as soon as the faces they must
+    #   follow are drawn, on cycles the farthest face goes first
+    #
+    def refine(self, order):
+        near = numpy.concatenate(self.near)
+        far = numpy.concatenate(self.far)
+        low = numpy.concatenate(self.low)
+        high = numpy.concatenate(self.high)
+        normals = numpy.concatenate(self.normals)
+        distances = numpy.concatenate(self.distances)
+        points = numpy.concatenate(self.points)
+        totals = numpy.concatenate(self.totals)
+        starts = numpy.cumsum(totals) - totals
+        #   side of every plane the camera is on
+        if self.perspective:
+            viewer = numpy.where(distances >= 0, 1.0, -1.0)
+        else:
+            viewer = numpy.where(normals[:, 2] >= 0, 1.0, -1.0)
+        eps = 0.0001
+        
+        #   pairs of faces, the first one is drawn before the second
+        before = []
+        after = []
+        for k, p in enumerate(order.tolist()):
+            rest = order[k + 1:]
+            rest = rest[(low[rest] < high[p]).all(axis = 1) & (high[rest] > low[p]).all(axis = 1)]
+            #   faces nearer than p stay after it
+            overlap = far[rest] > near[p] + eps
+            before.append(numpy.full(len(rest) - numpy.count_nonzero(overlap), p))
+            after.append(rest[~overlap])
+            rest = rest[overlap]
+            if len(rest) == 0:
+                continue
+            
+            #   vertices of p by the planes of the faces
+            values = (numpy.dot(points[starts[p]:starts[p] + totals[p]], normals[rest].T) + distances[rest]) * viewer[rest]
+            p_behind = (values <= eps).all(axis = 0)
+            p_front = (values >= -eps).all(axis = 0)
+            #   vertices of the faces by the plane of p
+            count = totals[rest]
+            offsets = numpy.cumsum(count) - count
+            loops = numpy.repeat(starts[rest] - offsets, count) + numpy.arange(int(count.sum()))
+            values = (numpy.dot(points[loops], normals[p]) + distances[p]) * viewer[p]
+            q_behind = numpy.maximum.reduceat(values, offsets) <= eps
+            q_front = numpy.minimum.reduceat(values, offsets) >= -eps
+            
+            p_first = p_behind | q_front
+            q_first = q_behind | p_front
+            before.append(numpy.full(numpy.count_nonzero(p_first & ~q_first), p))
+            after.append(rest[p_first & ~q_first])
+            before.append(rest[q_first & ~p_first])
+            after.append(numpy.full(numpy.count_nonzero(q_first & ~p_first), p))
+        
+        #   faces following every face
+        before = numpy.concatenate(before + [numpy.empty(0, dtype=numpy.int64)]).astype(numpy.int64)
+        after = numpy.concatenate(after + [numpy.empty(0, dtype=numpy.int64)]).astype(numpy.int64)
+        index = numpy.argsort(before, kind = 'stable')
+        following = after[index]
+        first = numpy.searchsorted(before[index], numpy.arange(len(order) + 1))
+        waiting = numpy.bincount(after, minlength = len(order))
+        
+        #   faces are taken by their rank in far to near order
+        rank = numpy.empty(len(order), dtype=numpy.int64)
+        rank[order] = numpy.arange(len(order))
+        ready = [rank[f] for f in numpy.flatnonzero(waiting == 0).tolist()]
+        heapq.heapify(ready)
+        drawn = numpy.zeros(len(order), dtype=bool)
+        result = []
+        next_rank = 0
+        while len(result) < len(order):
+            if len(ready) != 0:
+                f = order[heapq.heappop(ready)]
+                if drawn[f]:
+                    continue
+            else:
+                #   cycle, the farthest face waiting is drawn
+                while drawn[order[next_rank]]:
+                    next_rank += 1
+                f = order[next_rank]
+            drawn[f] = True
+            result.append(f)
+            faces = following[first[f]:first[f + 1]]
+            waiting[faces] -= 1
+            for g in faces[(waiting[faces] == 0) & ~drawn[faces]].tolist():
+                heapq.heappush(ready, rank[g])
+        
+        result = numpy.array(result, dtype=numpy.int64)
+        self.moved_count = self.moved_faces(rank[result])
+        return result
+    
+    #
+    #   least number of faces taken out of far to near order to get
+    #   the ranks, faces of the longest increasing run stay in place
+    #
+    @staticmethod
+    def moved_faces(ranks):
+        tails = []
+        for r in ranks.tolist():
+            i = bisect.bisect_left(tails, r)
+            if i == len(tails):
+                tails.append(r)
+            else:
+                tails[i] = r
+        return len(ranks) - len(tails)
+    
+#
+#   curve projected to the screen as cubic segments, both cameras
+#   divide by the depth, so segments are halved until the projected
+#   control points give the curve within the tolerance
+#
+class SVGCurve:
+    
+    #   max number of halvings of a segment
+    max_depth = 10
+    
+    def __init__(self, curve):
+        self.curve = curve
+        #   (points, cyclic) of the projected splines, points are
+        #   start point and three points of every segment
+        self.splines = []
+        #   distance from the camera to the centre of the control points
+        self.depth = 0.0
+        #   world space centre of the control points
+        self.position = numpy.zeros(3)
+        return
+    
+    def project(self, camera, world, tolerance):
+        curve = self.curve
+        view = numpy.dot(numpy.array(camera.view_matrix), world)
+        matrix = numpy.dot(numpy.array(camera.proj_matrix), view)
+        co = numpy.dot(curve.co, view[:3, :3].T) + view[:3, 3]
+        self.depth = math.sqrt(float((co.mean(axis = 0) ** 2).sum())) if len(co) != 0 else 0.0
+        if len(co) != 0:
+            self.position = numpy.dot(world[:3, :3], curve.co.mean(axis = 0)) + world[:3, 3]
+        
+        #   segments of all splines, splines are numbered
+        counts = numpy.asarray(curve.counts, dtype=numpy.int64)
+        segments = (counts - 1) // 3
+        starts = numpy.cumsum(counts) - counts
+        first = numpy.repeat(starts - 3 * (numpy.cumsum(segments) - segments), segments) + 3 * numpy.arange(int(segments.sum()))
+        control = curve.co[first[:, None] + numpy.arange(4)]
+        spline = numpy.repeat(numpy.arange(len(counts)), segments)
+        position = numpy.arange(len(spline), dtype=numpy.float64)
+        
+        #   curve is inside of the hull of its control points, segments
+        #   reaching the planes in front of the eye are dropped and their
+        #   splines are open
+        broken = numpy.zeros(len(counts), dtype=bool)
+        planes = numpy.dot(SVGFrustum(camera).near_planes(), view)
+        visible = (plane_values(planes, curve.co)[first[:, None] + numpy.arange(4)] >= 0).all(axis = (1, 2))
+        if not visible.all():
+            log.debug("%d segments of curve %s are behind the camera", numpy.count_nonzero(~visible), curve.name)
+            broken[spline[~visible]] = True
+            control, spline, position = control[visible], spline[visible], position[visible]
+        control, spline, position = self.subdivide(matrix, camera, control, spline, position, tolerance)
+        
+        self.splines = []
+        if len(spline) == 0:
+            return
+        points = project_points(matrix, control.reshape(-1, 3), camera.width, camera.height).reshape(-1, 4, 3)
+        order = numpy.lexsort((position, spline))
+        points, spline, position = points[order], spline[order], position[order]
+        
+        #   segments dropped in the middle of the spline break it
+        start = numpy.flatnonzero(numpy.r_[True, (spline[1:] != spline[:-1]) | (points[1:, 0] != points[:-1, 3]).any(axis = 1)])
+        end = numpy.r_[start[1:], len(spline)]
+        for a, b in zip(start.tolist(), end.tolist()):
+            n = spline[a]
+            self.splines.append((numpy.concatenate((points[a, :1], points[a:b, 1:].reshape(-1, 3))), bool(curve.cyclic[n]) and not broken[n]))
+        return
+    
+    #
+    #   halves segments whose projected control points give the
+    #   curve farther than the tolerance from the projected curve,
+    #   position keeps the order of the halves along the spline
+    #
+    def subdivide(self, matrix, camera, control, spline, position, tolerance):
+        done = []
+        size = 1.0
+        t = numpy.array((0.25, 0.5, 0.75))
+        #   bernstein weights of the samples
+        weights = numpy.stack(((1 - t) ** 3, 3 * t * (1 - t) ** 2, 3 * t * t * (1 - t), t ** 3), axis = 1)
+        for depth in range(self.max_depth):
+            if len(control) == 0:
+                break
+            exact = project_points(matrix, numpy.einsum('ij,sjk->sik', weights, control).reshape(-1, 3), camera.width, camera.height)
+            projected = project_points(matrix, control.reshape(-1, 3), camera.width, camera.height).reshape(-1, 4, 3)
+            approximate = numpy.einsum('ij,sjk->sik', weights, projected[:, :, :2]).reshape(-1, 2)
+            error = numpy.sqrt(((exact[:, :2] - approximate) ** 2).sum(axis = 1)).reshape(-1, 3).max(axis = 1)
+            good = error <= tolerance
+            done.append((control[good], spline[good], position[good]))
+            
+            #   de casteljau halving in 3d
+            c = control[~good]
+            ab = (c[:, 0] + c[:, 1]) / 2
+            bc = (c[:, 1] + c[:, 2]) / 2
+            cd = (c[:, 2] + c[:, 3]) / 2
+            abc = (ab + bc) / 2
+            bcd = (bc + cd) / 2
+            middle = (abc + bcd) / 2
+            size /= 2
+            control = numpy.concatenate((numpy.stack((c[:, 0], ab, abc, middle), axis = 1),
+                                         numpy.stack((middle, bcd, cd, c[:, 3]), axis = 1)))
+            spline = numpy.concatenate((spline[~good], spline[~good]))
+            position = numpy.concatenate((position[~good], position[~good] + size))
+        done.append((control, spline, position))
+        return (numpy.concatenate([d[0] for d in done]).reshape(-1, 4, 3),
+                numpy.concatenate([d[1] for d in done]), numpy.concatenate([d[2] for d in done]))
+    
+#
+#   contains view and projection matrices
+#   ortho projection is not supported yet
+class SVGCamera:
+       
+    def __init__(self):
+        self.view_matrix = Matrix()
+        self.proj_matrix = Matrix()      
+        self.width = 0
+        self.height = 0
+        self.perspective = True
+        self.clip_start = 0.1
+        self.clip_end = 100.0
+    
+    #
+    #   camera is SVGCameraData snapshot of the blender camera
+    #
+    def make_camera(self, camera, width, height):
+        m = Matrix(camera.matrix.tolist())
+        self.view_matrix = m.inverted()        
+        self.proj_matrix = Matrix()
+        self.width = width
+        self.height = height
+        self.perspective = camera.type != 'ORTHO'
+        self.clip_start = camera.clip_start
+        self.clip_end = camera.clip_end
+                
+        if camera.type == 'PERSP':
+            #   build perspective projection
+            aspect = self.width / self.height
+            self.proj_matrix = make_projection_matrix(camera.angle_x, aspect, camera.clip_start, camera.clip_end)
+        elif camera.type == 'ORTHO':
+            self.proj_matrix = make_ortho_projection_matrix(self.width, self.height, camera.clip_start, camera.clip_end, camera.ortho_scale)
+        else:
+            log.warning("Unsupported camera type %s", camera.type)
+        
+        log.debug("View matrix:\n%s", self.view_matrix)
+        log.debug("Projection matrix:\n%s", self.proj_matrix)
+        return
+    
+
+#
+#   camera settings copied out of blender or read from snapshot
+#
+class SVGCameraData:
+    
+    def __init__(self, name, type, angle_x, clip_start, clip_end, ortho_scale, matrix):
+        self.name = name
+        self.type = type
+        self.angle_x = angle_x
+        self.clip_start = clip_start
+        self.clip_end = clip_end
+        self.ortho_scale = ortho_scale
+        #   4x4 world matrix
+        self.matrix = matrix
+        return
+
+#
+#   object of the frame, mesh data is shared between frames
+#   while it doesn't change
+#
+class SVGObjectData:
+    
+    def __init__(self, name, matrix, mesh, curve = None):
+        self.name = name
+        self.matrix = matrix
+        self.mesh = mesh
+        #   SVGCurveData of curve objects, they have no mesh
+        self.curve = curve
+        return
+
+#
+#   everything needed to export one file, no blender data is
+#   referenced, so frames can be exported in other processes
+#
+class SVGFrameData:
+    
+    def __init__(self, frame, path, width, height, camera, objects):
+        self.frame = frame
+        self.path = path
+        self.width = width
+        self.height = height
+        self.camera = camera
+        self.objects = objects
+        return
+
+#
+#   view volume of the drawn projection as planes in view space,
+#   point x is inside if dot(normal, x) + offset >= 0 for all
+#   planes, screen coordinates are divided by the third coordinate
+#   of the projection, so its sign can't change inside the volume
+#
+class SVGFrustum:
+    
+    def __init__(self, camera):
+        m = numpy.array(camera.proj_matrix)
+        #   divisor is positive in front of perspective camera,
+        #   ortho matrix mirrors the screen and divisor is negative
+        d = m[2] if camera.perspective else -m[2]
+        self.view = numpy.array(camera.view_matrix)
+        self.planes = numpy.array([d - m[0], d + m[0], d - m[1], d + m[1],
+                                   d - (0.0, 0.0, 0.0, 1e-6),
+                                   (0.0, 0.0, -1.0, -camera.clip_start),
+                                   (0.0, 0.0, 1.0, camera.clip_end)])
+        return
+    
+    #
+    #   planes keeping points in front of the eye, the first one is
+    #   the divisor of the projection, points behind them are
+    #   projected through the eye and must be clipped
+    #
+    def near_planes(self):
+        return self.planes[4:6]
+    
+    #
+    #   planes in the space of the object with the world matrix
+    #
+    def object_planes(self, matrix):
+        return numpy.dot(self.planes, numpy.dot(self.view, matrix))
+    
+    #
+    #   returns 'OUTSIDE', 'INSIDE' or 'CROSSING' for the bounding
+    #   box of the points
+    #
+    def classify_box(self, planes, points):
+        if len(points) == 0:
+            return 'OUTSIDE'
+        low = points.min(axis = 0)
+        high = points.max(axis = 0)
+        corners = numpy.array([(x, y, z) for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])])
+        values = plane_values(planes, corners)
+        if (values < 0).all(axis = 0).any():
+            return 'OUTSIDE'
+        if (values >= 0).all():
+            return 'INSIDE'
+        return 'CROSSING'
+
+#
+#   (N, P) values of the planes at the points
+#
+def plane_values(planes, points):
+    return numpy.dot(points, planes[:, :3].T) + planes[:, 3]
+
+#
+#   clips polygon by the planes, points are (N, 3) coordinates and
+#   values are (N, P) plane values at them, returns points of the
+#   part inside all planes
+#
+def clip_polygon(points, values):
+    for k in range(values.shape[1]):
+        if (values[:, k] >= 0).all():
+            continue
+        clipped_points = []
+        clipped_values = []
+        count = len(points)
+        for i in range(count):
+            j = (i + 1) % count
+            a = values[i, k]
+            b = values[j, k]
+            if a >= 0:
+                clipped_points.append(points[i])
+                clipped_values.append(values[i])
+            if (a >= 0) != (b >= 0):
+                t = a / (a - b)
+                clipped_points.append(points[i] + t * (points[j] - points[i]))
+                clipped_values.append(values[i] + t * (values[j] - values[i]))
+        if len(clipped_points) < 3:
+            return numpy.empty((0, 3))
+        points = numpy.array(clipped_points)
+        values = numpy.array(clipped_values)
+    return points
+
+#
+#   clips (N, 2, 3) segments by the planes, values are (N, 2, P)
+#   plane values at their ends, returns parts inside all planes
+#
+def clip_segments(segments, values):
+    a = segments[:, 0]
+    b = segments[:, 1]
+    va = values[:, 0]
+    vb = values[:, 1]
+    keep = numpy.ones(len(segments), dtype=bool)
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        for k in range(values.shape[2]):
+            fa = va[:, k]
+            fb = vb[:, k]
+            keep &= (fa >= 0) | (fb >= 0)
+            t = (fa / (fa - fb))[:, None]
+            #   end behind the plane is moved to the plane
+            move = ((fa < 0) & (fb >= 0))[:, None]
+            a, va = numpy.where(move, a + t * (b - a), a), numpy.where(move, va + t * (vb - va), va)
+            move = ((fb < 0) & (fa >= 0))[:, None]
+            b, vb = numpy.where(move, a + t * (b - a), b), numpy.where(move, va + t * (vb - va), vb)
+    return numpy.stack((a[keep], b[keep]), axis = 1)
+
+#
+#   clips (T, 3, 3) triangles by the planes, values are (T, 3, P)
+#   plane values at their corners, clipped parts are split into
+#   fans of triangles
+#
+def clip_triangles(triangles, values):
+    crossing = (values < 0).any(axis = (1, 2))
+    pieces = [triangles[~crossing]]
+    for points, v in zip(triangles[crossing], values[crossing]):
+        polygon = clip_polygon(points, v)
+        if len(polygon) >= 3:
+            pieces.append(numpy.stack((numpy.repeat(polygon[:1], len(polygon) - 2, axis = 0), polygon[1:-1], polygon[2:]), axis = 1))
+    return numpy.concatenate(pieces)
+
+#
+#   screen samples covered by filled polygons, polygons are passed
+#   front to back, polygon is occluded when all samples around it
+#   are covered, every point closer than half of the stroke width
+#   to a covered sample is painted by the fill or the stroke of the
+#   polygon covering the sample, so the test never drops a polygon
+#   that shows through
+#
+class SVGCoverage:
+
+    def __init__(self, width, height, line_width, rounding = 0.0):
+        self.width = width
+        self.height = height
+        self.spacing = SVGCoverage.sample_spacing(line_width, rounding)
+        #   stroke with miter joins reaches twice its width out of the polygon
+        self.margin = 2.0 * line_width + rounding
+        self.covered = numpy.zeros((int(math.ceil(height / self.spacing)) + 1, int(math.ceil(width / self.spacing)) + 1), dtype=bool)
+        self.occluded_count = 0
+        return
+
+    #
+    #   distance between samples for the stroke width, coordinates
+    #   written to the file may move by rounding
+    #
+    @staticmethod
+    def sample_spacing(line_width, rounding = 0.0):
+        return (0.5 * line_width - rounding) * math.sqrt(2.0)
+
+    #
+    #   returns slices and mask of the samples inside the polygon or
+    #   closer than distance to it, even-odd rule never marks sample
+    #   outside of nonzero filled polygon, samples out of the screen
+    #   are not kept because nothing is drawn there
+    #
+    def region(self, points, distance = 0.0):
+        p = points[:, :2].tolist()
+        low = points[:, :2].min(axis = 0) - distance
+        high = points[:, :2].max(axis = 0) + distance
+        x0 = max(int(math.ceil(low[0] / self.spacing)), 0)
+        y0 = max(int(math.ceil(low[1] / self.spacing)), 0)
+        x1 = min(int(math.floor(high[0] / self.spacing)), self.covered.shape[1] - 1)
+        y1 = min(int(math.floor(high[1] / self.spacing)), self.covered.shape[0] - 1)
+        if x1 < x0 or y1 < y0:
+            return None, None
+        x = numpy.arange(x0, x1 + 1) * self.spacing
+        y = numpy.arange(y0, y1 + 1) * self.spacing
+
+        inside = numpy.zeros((len(y), len(x)), dtype=bool)
+        near = numpy.zeros((len(y), len(x)), dtype=bool)
+        for a, b in zip(p, p[1:] + p[:1]):
+            if distance > 0:
+                ex = b[0] - a[0]
+                ey = b[1] - a[1]
+                dx = x[None, :] - a[0]
+                dy = y[:, None] - a[1]
+                length = ex * ex + ey * ey
+                t = numpy.clip((dx * ex + dy * ey) / length, 0.0, 1.0) if length > 0 else 0.0
+                near |= (dx - t * ex) ** 2 + (dy - t * ey) ** 2 <= distance * distance
+            if a[1] != b[1]:
+                crossing = (a[1] > y) != (b[1] > y)
+                x_cross = a[0] + (y - a[1]) * (b[0] - a[0]) / (b[1] - a[1])
+                inside ^= crossing[:, None] & (x[None, :] < x_cross[:, None])
+        return (slice(y0, y1 + 1), slice(x0, x1 + 1)), inside | near
+
+    #
+    #   painted points of the polygon are closer than the margin to
+    #   it and have a sample closer than half of the spacing diagonal
+    #
+    def occluded(self, points):
+        #   samples at the vertices reject most visible polygons quickly
+        x = numpy.clip(numpy.rint(points[:, 0] / self.spacing).astype(numpy.int64), 0, self.covered.shape[1] - 1)
+        y = numpy.clip(numpy.rint(points[:, 1] / self.spacing).astype(numpy.int64), 0, self.covered.shape[0] - 1)
+        if not self.covered[y, x].all():
+            return False
+        window, mask = self.region(points, self.margin + self.spacing / math.sqrt(2.0))
+        if window == None:
+            return True
+        return bool(self.covered[window][mask].all())
+
+    def add(self, points):
+        if len(points) < 3:
+            return
+        window, mask = self.region(points)
+        if window != None:
+            self.covered[window] |= mask
+        return
+
+    #
+    #   returns indices of the polygons that are not occluded,
+    #   polygons are given in drawing order
+    #
+    def cull(self, polygons):
+        visible = []
+        for i in range(len(polygons) - 1, -1, -1):
+            if self.occluded(polygons[i]):
+                self.occluded_count += 1
+                continue
+            self.add(polygons[i])
+            visible.append(i)
+        visible.reverse()
+        return visible
+
+#
+#   line drawing of the silhouettes, borders and creases of all
+#   objects, parts of the lines hidden by faces are removed, so
+#   only visible segments are written
+#
+class SVGLineDrawing:
+    
+    def __init__(self, camera, max_value, planes):
+        self.camera = camera
+        self.max_value = max_value
+        #   center of the perspective projection in view space,
+        #   points on the rays going through it are drawn at the
+        #   same place, ortho camera looks along -z
+        self.eye = None
+        if camera.perspective:
+            m = numpy.array(camera.proj_matrix)
+            self.eye = numpy.linalg.solve(m[:3, :3], -m[:3, 3])
+        #   view space planes lines and triangles are clipped by
+        self.planes = planes
+        #   view space (E, 2, 3) lines and (T, 3, 3) triangles of all objects
+        self.lines = []
+        self.triangles = []
+        #   screen cells with triangles overlapping them
+        self.cells = 64
+        return
+    
+    #
+    #   adds feature edges of the object and all its faces
+    #   as occluders
+    #
+    def add(self, object):
+        mesh = object.mesh
+        m = numpy.dot(numpy.array(self.camera.view_matrix), object.matrix)
+        co = numpy.dot(mesh.co, m[:3, :3].T) + m[:3, 3]
+        normals = numpy.dot(mesh.normals, numpy.linalg.inv(m[:3, :3]))
+        
+        #   front faces look at the eye
+        front = (normals * self.toward_eye(co[mesh.loops[mesh.starts]])).sum(axis = 1) > 0
+        adjacency = edge_adjacency(mesh)
+        visible = adjacency.feature_edges(front, self.max_value)
+        lines = co[adjacency.edges[visible]]
+        
+        #   polygons are split into fans of triangles
+        count = numpy.maximum(mesh.totals - 2, 0)
+        polygon = numpy.repeat(numpy.arange(len(mesh.starts)), count)
+        i = numpy.arange(len(polygon)) - numpy.repeat(numpy.cumsum(count) - count, count) + 1
+        start = mesh.starts[polygon]
+        fan = numpy.stack([mesh.loops[start], mesh.loops[start + i], mesh.loops[start + i + 1]], axis = 1)
+        triangles = co[fan]
+        
+        #   parts behind the eye would be projected through it
+        values = plane_values(self.planes, co)
+        if (values < 0).any():
+            lines = clip_segments(lines, values[adjacency.edges[visible]])
+            triangles = clip_triangles(triangles, values[fan])
+        self.lines.append(lines)
+        self.triangles.append(triangles)
+        return
+    
+    #
+    #   directions from the points to the eye
+    #
+    def toward_eye(self, points):
+        if self.eye is None:
+            return numpy.broadcast_to((0.0, 0.0, 1.0), points.shape)
+        return self.eye - points
+    
+    #
+    #   screen positions of the points, with ortho camera view
+    #   coordinates are enough to find overlapping lines and
+    #   triangles
+    #
+    def screen(self, points):
+        if self.eye is None:
+            return points[:, :2]
+        return project_points(self.camera.proj_matrix, points, self.camera.width, self.camera.height)[:, :2]
+    
+    #
+    #   half-spaces of the volumes hidden by the triangles, point x
+    #   is hidden if dot(normal, x) + offset >= 0 for all 4 planes,
+    #   3 planes go through the eye and edges of the triangle, the
+    #   last one is the plane of the triangle
+    #
+    def hidden_volumes(self, triangles, eps):
+        p, q, r = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        normals = numpy.empty((len(triangles), 4, 3))
+        offsets = numpy.empty((len(triangles), 4))
+        for k, (a, b, c) in enumerate(((p, q, r), (q, r, p), (r, p, q))):
+            n = numpy.cross(b - a, self.toward_eye(a))
+            n *= numpy.where((n * (c - a)).sum(axis = 1) < 0, -1.0, 1.0)[:, None]
+            normals[:, k] = n
+            offsets[:, k] = -(n * a).sum(axis = 1)
+        
+        n = numpy.cross(q - p, r - p)
+        length = numpy.sqrt((n * n).sum(axis = 1))
+        n /= numpy.maximum(length, 1e-300)[:, None]
+        eye = (n * self.toward_eye(p)).sum(axis = 1)
+        #   hidden side is away from the eye, points lying on the
+        #   plane are not hidden by it
+        n *= numpy.where(eye > 0, -1.0, 1.0)[:, None]
+        normals[:, 3] = n
+        offsets[:, 3] = -(n * p).sum(axis = 1) - eps
+        #   degenerate triangles and triangles seen edge-on hide nothing
+        valid = (length > 1e-12) & (numpy.abs(eye) > 1e-9)
+        return normals, offsets, valid
+    
+    #
+    #   parts of the line [a, b] that are not hidden, returned as
+    #   intervals of the line parameter
+    #
+    def visible_parts(self, a, b, normals, offsets):
+        fa = numpy.einsum('kij,j->ki', normals, a) + offsets
+        fb = numpy.einsum('kij,j->ki', normals, b) + offsets
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            t = fa / (fa - fb)
+        enter = (fa < 0) & (fb >= 0)
+        leave = (fa >= 0) & (fb < 0)
+        outside = ((fa < 0) & (fb < 0)).any(axis = 1)
+        t0 = numpy.where(enter, t, 0.0).max(axis = 1)
+        t1 = numpy.where(leave, t, 1.0).min(axis = 1)
+        hidden = ~outside & (t1 > t0)
+        
+        parts = []
+        start = 0.0
+        for h0, h1 in sorted(zip(t0[hidden].tolist(), t1[hidden].tolist())):
+            if h0 > start:
+                parts.append((start, h0))
+            start = max(start, h1)
+        if start < 1.0:
+            parts.append((start, 1.0))
+        return parts
+    
+    #
+    #   returns visible segments in view space
+    #
+    def visible_segments(self):
+        lines = numpy.concatenate([numpy.empty((0, 2, 3))] + self.lines)
+        triangles = numpy.concatenate([numpy.empty((0, 3, 3))] + self.triangles)
+        log.debug("Lines %d, occluding triangles %d", len(lines), len(triangles))
+        if len(lines) == 0:
+            return []
+        
+        scale = max(1.0, numpy.abs(lines).max(), numpy.abs(triangles).max() if len(triangles) != 0 else 0.0)
+        normals, offsets, valid = self.hidden_volumes(triangles, 1e-5 * scale)
+        triangles = triangles[valid]
+        normals = normals[valid]
+        offsets = offsets[valid]
+        
+        #   screen bounds and depth range of lines and triangles
+        line_screen = self.screen(lines.reshape(-1, 3)).reshape(-1, 2, 2)
+        tri_screen = self.screen(triangles.reshape(-1, 3)).reshape(-1, 3, 2)
+        line_low, line_high = line_screen.min(axis = 1), line_screen.max(axis = 1)
+        tri_low, tri_high = tri_screen.min(axis = 1), tri_screen.max(axis = 1)
+        line_far = -lines[:, :, 2].min(axis = 1)
+        tri_near = -triangles[:, :, 2].max(axis = 1)
+        
+        #   triangles are registered in the cells of the screen grid
+        cells = [[] for i in range(self.cells * self.cells)]
+        origin = numpy.minimum(line_low.min(axis = 0), tri_low.min(axis = 0) if len(triangles) != 0 else line_low.min(axis = 0))
+        extent = numpy.maximum(line_high.max(axis = 0), tri_high.max(axis = 0) if len(triangles) != 0 else line_high.max(axis = 0)) - origin
+        size = numpy.maximum(extent / self.cells, 1e-9)
+        def cell_range(low, high):
+            c0 = numpy.clip(((low - origin) / size).astype(numpy.int64), 0, self.cells - 1)
+            c1 = numpy.clip(((high - origin) / size).astype(numpy.int64), 0, self.cells - 1)
+            return c0.tolist(), c1.tolist()
+        c0, c1 = cell_range(tri_low, tri_high)
+        for k in range(len(triangles)):
+            for y in range(c0[k][1], c1[k][1] + 1):
+                for x in range(c0[k][0], c1[k][0] + 1):
+                    cells[y * self.cells + x].append(k)
+        cells = [numpy.array(cell, dtype=numpy.int64) for cell in cells]
+        
+        segments = []
+        c0, c1 = cell_range(line_low, line_high)
+        for e in range(len(lines)):
+            candidates = [cells[y * self.cells + x] for y in range(c0[e][1], c1[e][1] + 1) for x in range(c0[e][0], c1[e][0] + 1)]
+            candidates = numpy.unique(numpy.concatenate([numpy.empty(0, dtype=numpy.int64)] + candidates))
+            #   only triangles overlapping the line on the screen and
+            #   nearer than its far end can hide it
+            k = candidates[(tri_near[candidates] < line_far[e]) &
+                           (tri_low[candidates] <= line_high[e]).all(axis = 1) &
+                           (tri_high[candidates] >= line_low[e]).all(axis = 1)]
+            a, b = lines[e]
+            for t0, t1 in self.visible_parts(a, b, normals[k], offsets[k]):
+                if t1 - t0 > 1e-6:
+                    segments.append(numpy.array([a + t0 * (b - a), a + t1 * (b - a)]))
+        log.debug("Visible segments %d", len(segments))
+        return segments
+
+class BSPTree:
+    __slots__ = ("splitter", "front", "back")
+    
+    def __init__(self):
+        self.splitter = []
+        self.front = None
+        self.back = None
+        return
+
+#
+#   growable array, rows are appended to the end and the storage
+#   is doubled when it is full
+#
+class BSPBuffer:
+    __slots__ = ("data", "count")
+    
+    def __init__(self, shape = (), dtype = numpy.float64, capacity = 256):
+        self.data = numpy.empty((capacity,) + tuple(shape), dtype=dtype)
+        self.count = 0
+        return
+    
+    def __len__(self):
+        return self.count
+    
+    #
+    #   used part of the storage, views made before the buffer
+    #   grows keep old rows
+    #
+    def view(self):
+        return self.data[:self.count]
+    
+    #
+    #   appends rows and returns index of the first one
+    #
+    def extend(self, rows):
+        rows = numpy.asarray(rows, dtype=self.data.dtype)
+        first = self.count
+        count = first + len(rows)
+        if count > len(self.data):
+            data = numpy.empty((max(count, 2 * len(self.data)),) + self.data.shape[1:], dtype=self.data.dtype)
+            data[:first] = self.data[:first]
+            self.data = data
+        self.data[first:count] = rows
+        self.count = count
+        return first
+    
+    def truncate(self, count):
+        self.count = min(self.count, count)
+        return
+
+#
+#   faces of a convex object, every face lies behind the planes
+#   of all other faces, so the faces never need to be classified
+#   against each other
+#
+class BSPCluster:
+    __slots__ = ("faces", "vertices", "center", "radius")
+    
+    def __init__(self, faces, vertices, points):
+        self.faces = faces
+        self.vertices = vertices
+        #   bounding sphere for quick classification
+        self.center = points.mean(axis = 0)
+        self.radius = float(numpy.sqrt(((points - self.center) ** 2).sum(axis = 1)).max())
+        return
+                        
+#
+#   bsp compiler used to make bsp trees, faces are indices of
+#   the rows of packed arrays, vertex indices of face f are
+#   loops[starts[f]:starts[f] + totals[f]]
+#
+class BSPCompiler:
+    
+    #   names of the sides returned by classify_sides
+    sides = ("ON", "FRONT", "BACK", "SPANNING")
+    
+    def __init__(self):
+        #   world positions of the vertices
+        self.positions = BSPBuffer((3,))
+        #   vertex indices of all faces
+        self.loops = BSPBuffer((), numpy.int64)
+        self.starts = BSPBuffer((), numpy.int64)
+        self.totals = BSPBuffer((), numpy.int64)
+        #   planes of the faces
+        self.normals = BSPBuffer((3,))
+        self.distances = BSPBuffer(())
+        #   faces and clusters waiting for compilation
+        self.faces = []
+        self.root = BSPTree()
+        self.camera = None
+        #   projection of the camera and projected vertices, world
+        #   positions stay intact
+        self.matrix = numpy.identity(4)
+        self.screen = numpy.empty((0, 3))
+        #   faces outside of the view and faces crossing its bounds,
+        #   None when faces are not culled when they are drawn
+        self.culled = None
+        self.crossing = None
+        #   splitter selection strategy, 'FIRST' or 'BALANCED'
+        self.splitter = 'FIRST'
+        #   number of candidate splitters scored by 'BALANCED' strategy
+        self.candidates = 8
+        #   max number of faces candidates are scored against
+        self.sample_faces = 256
+        #   cost of one split relative to one face of imbalance
+        self.split_cost = 8.0
+        #   insert convex meshes as clusters
+        self.convex = False
+        #   cull faces outside of the view and clip faces crossing it, faces of
+        #   the tree made for one view are culled when they are added, faces
+        #   of other trees when they are drawn
+        self.culling = False
+        #   skip faces oriented backward the camera, tree is valid for one view only
+        self.back_culling = False
+        #   join coplanar faces drawn one after other
+        self.merge = False
+        #   intersection vertices made by split, keyed by splitter
+        #   face and edge, so faces sharing the edge share the vertex
+        self.intersections = {}
+        #   statistics of the last compilation
+        self.nodes = 0
+        self.depth = 0
+        self.splits = 0
+        return
+    
+    #
+    #   numbers of vertices, loops and faces, used to drop
+    #   everything added after
+    #
+    def size(self):
+        return (len(self.positions), len(self.loops), len(self.starts))
+    
+    def truncate(self, size):
+        vertices, loops, faces = size
+        self.positions.truncate(vertices)
+        self.loops.truncate(loops)
+        #   intersections made after are dropped together with their
+        #   vertices, so stale keys of reused face indices go away too
+        self.intersections = dict((key, v) for key, v in self.intersections.items() if v < vertices)
+        for buffer in (self.starts, self.totals, self.normals, self.distances):
+            buffer.truncate(faces)
+        return
+    
+    #
+    #   appends face and returns its index
+    #
+    def add_face(self, vertices, normal, distance):
+        start = self.loops.extend(vertices)
+        self.starts.extend((start,))
+        self.totals.extend((len(vertices),))
+        self.normals.extend((normal,))
+        return self.distances.extend((distance,))
+    
+    #
+    #   appends faces, loops are vertex indices of all faces one
+    #   after other, returns indices of the faces
+    #
+    def add_faces(self, loops, totals, normals, distances):
+        start = self.loops.extend(loops)
+        self.starts.extend(start + numpy.cumsum(totals) - totals)
+        self.totals.extend(totals)
+        self.normals.extend(normals)
+        first = self.distances.extend(distances)
+        return list(range(first, first + len(totals)))
+    
+    def face_vertices(self, face):
+        start = self.starts.data[face]
+        return self.loops.data[start:start + self.totals.data[face]]
+    
+    def project(self, camera):
+        self.camera = camera
+        self.matrix = numpy.dot(numpy.array(camera.proj_matrix), numpy.array(camera.view_matrix))
+        self.screen = project_points(self.matrix, self.positions.view(), camera.width, camera.height)
+        self.culled = None
+        self.crossing = None
+        if not self.culling or self.back_culling or len(self.starts) == 0:
+            return
+        
+        #   loops of the faces follow each other, every face is culled
+        #   when all its vertices are behind one plane
+        frustum = SVGFrustum(camera)
+        values = plane_values(frustum.object_planes(numpy.identity(4)), self.positions.view())[self.loops.view()]
+        self.culled = (numpy.maximum.reduceat(values, self.starts.view()) < 0).any(axis = 1).tolist()
+        self.crossing = (numpy.minimum.reduceat(values, self.starts.view()) < 0).any(axis = 1).tolist()
+        return
+    
+    def make_polygon(self, splitter):
+        return self.screen[self.face_vertices(splitter)]
+    
+    #
+    #   yields faces of the tree in back to front order relative
+    #   to the eye position, uses explicit stack instead of recursion,
+    #   items are (position, item) pairs of things drawn among the
+    #   faces, every item is passed down to the side of the splitters
+    #   its position is on and yielded in the empty subtree it reaches,
+    #   items lying on a splitter are drawn over its faces
+    #
+    def traverse(self, tree, eye, items = ()):
+        #   camera is in front of the faces
+        front = (numpy.dot(self.normals.view(), numpy.array(eye)) + self.distances.view() > 0).tolist()
+        stack = [(tree, list(items))]
+        while len(stack) != 0:
+            node, items = stack.pop()
+            if type(node) == list:  #   faces of the visited node
+                for face in node:
+                    yield face
+                continue
+            if node == None:
+                for position, item in items:
+                    yield item
+                continue
+            
+            splitter = node.splitter[0]
+            if front[splitter]:
+                first, last = node.back, node.front
+            else:   #   back
+                first, last = node.front, node.back
+            
+            first_items, last_items = [], []
+            if len(items) != 0:
+                values = numpy.dot(numpy.array([position for position, item in items]), self.normals.data[splitter]) + self.distances.data[splitter]
+                if not front[splitter]:
+                    values = -values
+                for item, value in zip(items, values.tolist()):
+                    if value < 0:
+                        first_items.append(item)
+                    else:
+                        last_items.append(item)
+            
+            if last != None or len(last_items) != 0:
+                stack.append((last, last_items))
+            stack.append((node.splitter, None))
+            if first != None or len(first_items) != 0:
+                stack.append((first, first_items))
+        return
+    
+    #
+    #   source of the export pipeline, yields polygons of the faces
+    #   back to front, points are taken when the polygon is pulled,
+    #   items are (position, primitives) pairs drawn among the faces
+    #
+    def primitives(self, tree, items = ()):
+        #   camera position is the same for all nodes
+        eye = self.camera.view_matrix.inverted().to_translation()
+        for face in self.traverse(tree, eye, items):
+            if type(face) == list:  #   primitives of the item
+                for primitive in face:
+                    yield primitive
+            elif self.culled == None:
+                yield SVGPrimitive(self.make_polygon(face), True, (255, 255, 255), (0, 0, 0), face)
+            elif self.culled[face]:
+                continue
+            elif self.crossing[face]:
+                #   clipped polygon isn't the face any more, so it isn't merged
+                points = self.clip_face(face)
+                if len(points) != 0:
+                    yield SVGPrimitive(points, True, (255, 255, 255), (0, 0, 0))
+            else:
+                yield SVGPrimitive(self.make_polygon(face), True, (255, 255, 255), (0, 0, 0), face)
+        return
+    
+    #
+    #   projected part of the face inside of the view
+    #
+    def clip_face(self, face):
+        camera = self.camera
+        frustum = SVGFrustum(camera)
+        points = self.positions.data[self.face_vertices(face)]
+        points = clip_polygon(points, plane_values(frustum.object_planes(numpy.identity(4)), points))
+        if len(points) == 0:
+            return points
+        return project_points(self.matrix, points, camera.width, camera.height)
+    
+    #
+    #   pipeline stage joining polygons of the faces that follow each
+    #   other in drawing order, lie in the same plane and share edges,
+    #   faces drawn one after other can be drawn in one go when they
+    #   don't overlap
+    #
+    def merge_stage(self, primitives):
+        run = []
+        for primitive in primitives:
+            face = primitive.face
+            if len(run) != 0 and (face == None or numpy.dot(self.normals.data[face], self.normals.data[run[0].face]) <= 0 or
+                                  self.classify_faces(run[0].face, face) != "ON"):
+                for merged in self.merge_primitives(run):
+                    yield merged
+                run = []
+            if face == None:
+                yield primitive
+            else:
+                run.append(primitive)
+        for merged in self.merge_primitives(run):
+            yield merged
+        return
+    
+    #
+    #   polygons of the outlines of the run, single faces are passed as is
+    #
+    def merge_primitives(self, run):
+        if len(run) < 2:
+            return run
+        first = run[0]
+        return [SVGPrimitive(self.screen[outline], True, first.fill_color, first.border_color)
+                for outline in self.merge_run([primitive.face for primitive in run])]
+    
+    #
+    #   outlines of coplanar faces, faces are joined along the edges
+    #   passed in opposite directions, vertices are matched by position
+    #   because faces split by the same plane get different vertices
+    #   at the same point, joined faces with holes are kept as is
+    #
+    def merge_run(self, run):
+        if len(run) < 2:
+            return [self.face_vertices(face) for face in run]
+        
+        index = {}
+        loops = []
+        for face in run:
+            vertices = self.face_vertices(face).tolist()
+            keys = numpy.round(self.positions.data[vertices], 6).tolist()
+            loop = []
+            for v, key in zip(vertices, keys):
+                v = index.setdefault(tuple(key), v)
+                if len(loop) == 0 or loop[-1] != v:
+                    loop.append(v)
+            if len(loop) > 1 and loop[0] == loop[-1]:
+                loop.pop()
+            loops.append(loop)
+        
+        #   faces sharing edges are grouped
+        group = list(range(len(loops)))
+        def find(i):
+            while group[i] != i:
+                group[i] = group[group[i]]
+                i = group[i]
+            return i
+        owner = {}
+        for i, loop in enumerate(loops):
+            for edge in zip(loop, loop[1:] + loop[:1]):
+                owner[edge] = i
+        for (a, b), i in owner.items():
+            j = owner.get((b, a))
+            if j != None:
+                group[find(i)] = find(j)
+        
+        groups = {}
+        for i in range(len(loops)):
+            groups.setdefault(find(i), []).append(i)
+        
+        outlines = []
+        for members in sorted(groups.values()):
+            if len(members) == 1:
+                outlines.append(self.face_vertices(run[members[0]]))
+                continue
+            #   edges inside of the group are passed in both directions
+            edges = set()
+            for i in members:
+                edges.update(zip(loops[i], loops[i][1:] + loops[i][:1]))
+            following = {}
+            for a, b in edges:
+                if (b, a) not in edges:
+                    following.setdefault(a, []).append(b)
+            count = sum(len(f) for f in following.values())
+            outline = []
+            if count != 0 and all(len(f) == 1 for f in following.values()):
+                v = next(iter(following))
+                while len(outline) <= count:
+                    outline.append(v)
+                    v = following[v][0]
+                    if v == outline[0]:
+                        break
+            if len(outline) != count:
+                outlines.extend(self.face_vertices(run[i]) for i in members)
+                continue
+            outlines.append(self.drop_collinear(outline))
+        return outlines
+    
+    #
+    #   removes vertices lying on the line through their neighbours
+    #
+    def drop_collinear(self, outline):
+        points = self.positions.data[outline]
+        a = points - numpy.roll(points, 1, axis = 0)
+        b = numpy.roll(points, -1, axis = 0) - points
+        length = numpy.sqrt((numpy.cross(a, b) ** 2).sum(axis = 1))
+        kept = numpy.array(outline)[length > 1e-6 * numpy.sqrt((a * a).sum(axis = 1) * (b * b).sum(axis = 1))]
+        return kept if len(kept) >= 3 else outline
+    
+    #
+    #   splits face b by the plane of face a, returns front and back
+    #   parts, intersection points are shared by both parts and by
+    #   the neighbour faces split along the same edge
+    #
+    def split(self, a, b):
+        if a == None or b == None:
+            log.error("Invalid arguments for splitting")
+        
+        index = self.face_vertices(b).tolist()
+        points = self.positions.data[index]
+        values = (numpy.dot(points, self.normals.data[a]) + self.distances.data[a]).tolist()
+        points = points.tolist()
+        
+        front = []
+        back = []
+        prev_sign = 1 if values[0] > 0 else -1
+        cur = front if prev_sign == 1 else back
+        cur.append(index[0])
+        
+        index.append(index[0])
+        values.append(values[0])
+        points.append(points[0])
+        for i in range(1, len(index)):
+            sign = 1 if values[i] > 0 else -1
+            if prev_sign != sign:   #   found intersection
+                #   edge is taken from the lower vertex index, so the
+                #   neighbour face walking it backward gets the same point
+                j, k = (i - 1, i) if index[i - 1] < index[i] else (i, i - 1)
+                key = (a, index[j], index[k])
+                new_index = self.intersections.get(key)
+                if new_index == None:
+                    t = values[j] / (values[j] - values[k])
+                    p, q = points[j], points[k]
+                    new_index = self.positions.extend(((p[0] + t * (q[0] - p[0]), p[1] + t * (q[1] - p[1]), p[2] + t * (q[2] - p[2])),))
+                    self.intersections[key] = new_index
+                front.append(new_index)
+                back.append(new_index)
+                cur = front if sign == 1 else back
+                prev_sign = sign
+            if index[i] != index[-1]:
+                cur.append(index[i])
+        
+        normal = self.normals.data[b].copy()
+        distance = self.distances.data[b]
+        return (self.add_face(front, normal, distance), self.add_face(back, normal, distance))
+    
+    #
+    #   classifies faces by the plane of face a at once, returns
+    #   array with bit 1 set for faces having vertices in front of
+    #   the plane and bit 2 for faces having vertices behind it, so
+    #   0 is on the plane and 3 is spanning it
+    #
+    def classify_sides(self, a, faces):
+        faces = numpy.asarray(faces, dtype=numpy.int64)
+        totals = self.totals.data[faces]
+        offsets = numpy.cumsum(totals) - totals
+        loops = numpy.repeat(self.starts.data[faces] - offsets, totals) + numpy.arange(int(totals.sum()))
+        values = numpy.dot(self.positions.data[self.loops.data[loops]], self.normals.data[a]) + self.distances.data[a]
+        front = numpy.maximum.reduceat(values, offsets) > 0.0001
+        back = numpy.minimum.reduceat(values, offsets) < -0.0001
+        return front.astype(numpy.int64) | (back.astype(numpy.int64) << 1)
+    
+    def classify_faces(self, a, b):
+        return self.sides[self.classify_sides(a, (b,))[0]]
+
+    #
+    #   classifies all vertices of the cluster at once
+    #
+    def classify_cluster(self, a, cluster):
+        normal = self.normals.data[a]
+        d = numpy.dot(normal, cluster.center) + self.distances.data[a]
+        r = cluster.radius * math.sqrt(numpy.dot(normal, normal)) + 0.0001
+        if d > r:
+            return "FRONT"
+        if d < -r:
+            return "BACK"
+        
+        values = numpy.dot(self.positions.data[cluster.vertices], normal) + self.distances.data[a]
+        return self.sides[int((values > 0.0001).any()) | (int((values < -0.0001).any()) << 1)]
+    
+    #
+    #   classifies clusters by all their vertices at once, points are
+    #   positions of the vertices of all clusters, vertices of cluster
+    #   i start at offsets[i], sides are coded as in classify_sides
+    #
+    def classify_clusters(self, a, points, offsets):
+        values = numpy.dot(points, self.normals.data[a]) + self.distances.data[a]
+        front = numpy.maximum.reduceat(values, offsets) > 0.0001
+        back = numpy.minimum.reduceat(values, offsets) < -0.0001
+        return front.astype(numpy.int64) | (back.astype(numpy.int64) << 1)
+    
+    #
+    #   splits faces of the cluster by the plane of the face a,
+    #   both parts of a convex cluster stay convex
+    #
+    def split_cluster(self, a, cluster):
+        front = []
+        back = []
+        on = []
+        for f, side in zip(cluster.faces, self.classify_sides(a, cluster.faces).tolist()):
+            if side == 0:
+                on.append(f)
+            elif side == 1:
+                front.append(f)
+            elif side == 2:
+                back.append(f)
+            else:
+                self.splits += 1
+                ff = self.split(a, f)
+                front.append(ff[0])
+                back.append(ff[1])
+        return (self.make_cluster(front), self.make_cluster(back), on)
+    
+    #
+    #   wraps faces into cluster, single face is returned as is
+    #
+    def make_cluster(self, faces):
+        if len(faces) == 0:
+            return None
+        if len(faces) == 1:
+            return faces[0]
+        totals = self.totals.data[faces]
+        offsets = numpy.cumsum(totals) - totals
+        loops = numpy.repeat(self.starts.data[faces] - offsets, totals) + numpy.arange(int(totals.sum()))
+        vertices = numpy.unique(self.loops.data[loops])
+        return BSPCluster(faces, vertices, self.positions.data[vertices])
+    
+    #
+    #   picks splitter for the faces, 'BALANCED' strategy scores
+    #   evenly spaced candidates by the number of faces they split
+    #   and by the difference between front and back sets
+    #
+    def choose_splitter(self, faces):
+        if self.splitter != 'BALANCED' or len(faces) < 3:
+            return faces[0]
+        
+        step = max(1, len(faces) // self.candidates)
+        candidates = faces[::step][:self.candidates]
+        step = max(1, len(faces) // self.sample_faces)
+        sample = faces[::step]
+        
+        best = None
+        best_cost = 0
+        sample_faces = numpy.asarray(sample)
+        for c in candidates:
+            sides = self.classify_sides(c, sample_faces)
+            #   candidate itself is not counted
+            sides[sample_faces == c] = 0
+            counts = numpy.bincount(sides, minlength = 4).tolist()
+            cost = self.split_cost * counts[3] + abs(counts[1] - counts[2])
+            if best == None or cost < best_cost:
+                best = c
+                best_cost = cost
+        return best
+    
+    #
+    #   picks face of one of the clusters, rest of that cluster
+    #   is behind the face, so only other clusters are scored
+    #
+    def choose_cluster_splitter(self, clusters):
+        if self.splitter != 'BALANCED' or len(clusters) < 2:
+            return (clusters[0], clusters[0].faces[0])
+        
+        step = max(1, len(clusters) // self.candidates)
+        owners = clusters[::step][:self.candidates]
+        step = max(1, len(clusters) // self.sample_faces)
+        sample = clusters[::step]
+        
+        points = self.positions.data[numpy.concatenate([c.vertices for c in sample])]
+        totals = numpy.array([len(c.vertices) for c in sample])
+        offsets = numpy.cumsum(totals) - totals
+        best = None
+        best_cost = 0
+        for owner in owners:
+            #   owner is not scored against its own face
+            other = numpy.array([c is not owner for c in sample])
+            step = max(1, len(owner.faces) // self.candidates)
+            for c in owner.faces[::step][:self.candidates]:
+                sides = self.classify_clusters(c, points, offsets)
+                counts = numpy.bincount(sides[other], minlength = 4).tolist()
+                cost = self.split_cost * counts[3] + abs(counts[1] - counts[2])
+                if best == None or cost < best_cost:
+                    best = (owner, c)
+                    best_cost = cost
+        return best
+    
+    #
+    #   sorts faces to the front and back of the splitter, faces
+    #   lying on the splitter plane are appended to the on list,
+    #   single faces are classified at once
+    #
+    def partition(self, splitter, faces, on, owner = None):
+        single = [f for f in faces if type(f) != BSPCluster]
+        sides = iter(self.classify_sides(splitter, single).tolist() if len(single) != 0 else ())
+        front = []
+        back = []
+        for f in faces:
+            if type(f) == BSPCluster:
+                if f is owner:
+                    #   rest of the cluster is behind its own face
+                    rest = self.make_cluster([c for c in owner.faces if c != splitter])
+                    if rest != None:
+                        back.append(rest)
+                    continue
+                res = self.classify_cluster(splitter, f)
+                if res == "ON":
+                    on.extend(f.faces)
+                elif res == "FRONT":
+                    front.append(f)
+                elif res == "BACK":
+                    back.append(f)
+                elif res == "SPANNING":
+                    ff = self.split_cluster(splitter, f)
+                    if ff[0] != None:
+                        front.append(ff[0])
+                    if ff[1] != None:
+                        back.append(ff[1])
+                    on.extend(ff[2])
+                continue
+            side = next(sides)
+            if f == splitter:
+                continue
+            if side == 0:
+                on.append(f)
+            elif side == 1:
+                front.append(f)
+            elif side == 2:
+                back.append(f)
+            else:
+                self.splits += 1
+                ff = self.split(splitter, f)
+                front.append(ff[0])
+                back.append(ff[1])
+        return (front, back)
+    
+    def compile(self, tree, faces = None):
+        if faces == None:   #   use all faces
+            faces = self.faces
+        log.info("BSP compilation started")
+        self.nodes = 0
+        self.depth = 0
+        self.splits = 0
+            
+        if len(faces) == 0:
+            log.warning("No faces to build BSP tree")
+            return "NO_FACES"
+
+        self.build(tree, faces, 1)
+        log.info("BSP tree: nodes %d, depth %d, splits %d", self.nodes, self.depth, self.splits)
+        return
+    
+    #
+    #   builds subtree of the faces, uses an explicit stack of
+    #   pending nodes, so depth of the tree is not limited by
+    #   the recursion limit
+    #
+    def build(self, tree, faces, depth):
+        stack = [(tree, faces, depth)]
+        while len(stack) != 0:
+            tree, faces, depth = stack.pop()
+            self.nodes += 1
+            self.depth = max(self.depth, depth)
+        
+            #   clusters are pushed down the tree until no single
+            #   faces are left, than one of them is unrolled
+            owner = None
+            single = [f for f in faces if type(f) != BSPCluster]
+            if len(single) != 0:
+                splitter = self.choose_splitter(single)
+            else:
+                owner, splitter = self.choose_cluster_splitter(faces)
+            tree.splitter.append(splitter)
+            
+            front, back = self.partition(splitter, faces, tree.splitter, owner)
+            
+            #   front subtree is pushed last to be compiled first
+            if len(back) != 0:
+                tree.back = BSPTree()
+                stack.append((tree.back, back, depth + 1))
+            
+            if len(front) != 0:
+                tree.front = BSPTree()
+                stack.append((tree.front, front, depth + 1))
+        return
+    
+    #
+    #   merges faces into the tree and returns the new root, nodes
+    #   on the way of the faces are copied, so the source tree stays
+    #   valid and shares all untouched subtrees with the result
+    #
+    def insert(self, tree, faces):
+        if len(faces) == 0:
+            return tree
+        root = BSPTree()
+        stack = [(tree, faces, root, 1)]
+        while len(stack) != 0:
+            source, faces, node, depth = stack.pop()
+            if source == None:
+                self.build(node, faces, depth)
+                continue
+            
+            node.splitter = list(source.splitter)
+            node.front = source.front
+            node.back = source.back
+            front, back = self.partition(source.splitter[0], faces, node.splitter)
+            
+            if len(back) != 0:
+                node.back = BSPTree()
+                stack.append((source.back, back, node.back, depth + 1))
+            
+            if len(front) != 0:
+                node.front = BSPTree()
+                stack.append((source.front, front, node.front, depth + 1))
+        return root
+        
+    #
+    #   adds faces of the mesh object, camera is None when the tree
+    #   is kept for other views, otherwise objects outside of the
+    #   view are skipped
+    #
+    def add_mesh(self, camera, object):
+        log.debug("Add object %s to BSP compiler", object.name)
+        rotation = object.matrix[:3, :3]
+        normal_matrix = numpy.linalg.inv(rotation).T
+                
+        #   plane values of the vertices when the mesh crosses the view
+        mesh = object.mesh
+        values = None
+        if self.culling and camera != None:
+            frustum = SVGFrustum(camera)
+            planes = frustum.object_planes(object.matrix)
+            inside = frustum.classify_box(planes, mesh.co)
+            if inside == 'OUTSIDE':
+                log.debug("Object %s is outside of the view", object.name)
+                return
+            if inside == 'CROSSING' and self.back_culling:
+                values = plane_values(planes, mesh.co)
+                loop_values = values[mesh.loops]
+                #   faces with all vertices behind one plane are culled,
+                #   faces with vertices behind any plane are clipped
+                culled = (numpy.maximum.reduceat(loop_values, mesh.starts) < 0).any(axis = 1)
+                crossing = (numpy.minimum.reduceat(loop_values, mesh.starts) < 0).any(axis = 1)
+        
+        #   faces are front facing when the camera is in front of their planes,
+        #   orthographic camera looks along its z axis from everywhere, the
+        #   test is made in object space where the camera is moved to
+        facing = None
+        if self.back_culling:
+            inverse = numpy.linalg.inv(object.matrix)
+            view = numpy.linalg.inv(numpy.array(camera.view_matrix))
+            if camera.perspective:
+                eye = numpy.dot(inverse[:3, :3], view[:3, 3]) + inverse[:3, 3]
+                first = mesh.co[mesh.loops[mesh.starts]]
+                facing = ((eye - first) * mesh.normals).sum(axis = 1) > 0
+            else:
+                direction = numpy.dot(inverse[:3, :3], view[:3, 2])
+                facing = numpy.dot(mesh.normals, direction) > 0
+            log.debug("%d of %d faces of object %s are back facing", len(facing) - int(facing.sum()), len(facing), object.name)
+                
+        faces = numpy.ones(len(mesh.starts), dtype=bool)
+        if facing is not None:
+            faces &= facing
+        if values is not None:
+            faces &= ~culled
+        faces = numpy.flatnonzero(faces)
+        
+        #   vertices and normals of all faces are transformed into world space at once
+        base_index = self.positions.extend(numpy.dot(mesh.co, rotation.T) + object.matrix[:3, 3])
+        totals = mesh.totals[faces].astype(numpy.int64)
+        offsets = numpy.cumsum(totals) - totals
+        loops = mesh.loops[numpy.repeat(mesh.starts[faces] - offsets, totals) + numpy.arange(int(totals.sum()))] + base_index
+        normals = numpy.dot(mesh.normals[faces], normal_matrix.T)
+        
+        if values is not None and crossing[faces].any():
+            #   vertices of the clipped polygons are added after the mesh vertices
+            pieces = []
+            previous = 0
+            bounds = numpy.append(offsets, len(loops))
+            for f in numpy.flatnonzero(crossing[faces]).tolist():
+                pieces.append(loops[bounds[previous]:bounds[f]])
+                vertices = mesh.loops[mesh.starts[faces[f]]:mesh.starts[faces[f]] + totals[f]]
+                points = clip_polygon(mesh.co[vertices], values[vertices])
+                first = self.positions.extend(numpy.dot(points, rotation.T) + object.matrix[:3, 3])
+                pieces.append(numpy.arange(first, first + len(points)))
+                totals[f] = len(points)
+                previous = f + 1
+            pieces.append(loops[bounds[previous]:])
+            loops = numpy.concatenate(pieces)
+            #   faces clipped away completely have no vertices
+            normals = normals[totals != 0]
+            totals = totals[totals != 0]
+        
+        first = loops[numpy.cumsum(totals) - totals]
+        distances = -(normals * self.positions.data[first]).sum(axis = 1)
+        faces = self.add_faces(loops, totals, normals, distances)
+        
+        #   faces of convex mesh are added as a single cluster,
+        #   clipped parts of convex mesh are convex too
+        if self.convex and len(faces) > 1 and mesh_is_convex(mesh):
+            log.debug("Mesh %s is convex", mesh.name)
+            self.faces.append(self.make_cluster(faces))
+        else:
+            self.faces.extend(faces)
+        return    
+    
+    def add(self, camera, object):  
+        if object.mesh != None:
+            self.add_mesh(camera, object)
+        return
+    
+    #
+    #   number of faces waiting for compilation
+    #
+    def face_count(self):
+        count = 0
+        for f in self.faces:
+            count += len(f.faces) if type(f) == BSPCluster else 1
+        return count
+    
+#
+#   keeps BSP tree of the objects that don't change between
+#   frames, objects that do change are merged into a copy of
+#   it on every frame
+#
+class BSPCache:
+    
+    def __init__(self, make_compiler, profiler, disk_cache = None):
+        self.make_compiler = make_compiler
+        self.profiler = profiler
+        #   trees kept between sessions, BSPDiskCache or None
+        self.disk_cache = disk_cache
+        #   object name -> transform and mesh data signature
+        self.signatures = {}
+        #   names of the objects changed at least once
+        self.dynamic = set()
+        self.compiler = None
+        self.tree = None
+        #   sizes of the compiler arrays holding the static tree
+        self.size = (0, 0, 0)
+        self.rebuilds = 0
+        #   camera of the static tree
+        self.view = None
+    
+    def signature(self, object):
+        matrix = tuple(object.matrix.ravel().tolist())
+        if object.mesh != None:
+            return (matrix, object.mesh.name, object.mesh.signature)
+        return (matrix, None)
+    
+    #
+    #   returns tree of all objects for the current frame
+    #
+    def update(self, camera, objects):
+        changed = set()
+        for object in objects:
+            signature = self.signature(object)
+            if self.signatures.get(object.name, signature) != signature:
+                changed.add(object.name)
+            self.signatures[object.name] = signature
+        
+        #   tree without back faces is valid only for the camera it was made for
+        view = (tuple(numpy.array(camera.view_matrix).ravel().tolist()), tuple(numpy.array(camera.proj_matrix).ravel().tolist()))
+        moved = self.compiler != None and self.compiler.back_culling and view != self.view
+        self.view = view
+        
+        #   objects that start changing are taken out of the static tree
+        if self.compiler == None or len(changed - self.dynamic) != 0 or moved:
+            self.dynamic |= changed
+            self.rebuild(camera, [o for o in objects if o.name not in self.dynamic])
+        
+        #   drop vertices and faces of the previous frame
+        bsp = self.compiler
+        bsp.truncate(self.size)
+        bsp.faces = []
+        
+        dynamic = [o for o in objects if o.name in self.dynamic]
+        if len(dynamic) == 0:
+            return self.tree
+        
+        self.profiler.begin("add")
+        for object in dynamic:
+            bsp.add(camera, object)
+        self.profiler.end(faces = bsp.face_count(), vertices = len(bsp.positions) - self.size[0])
+        
+        self.profiler.begin("insert")
+        tree = bsp.insert(self.tree, bsp.faces)
+        self.profiler.end(vertices = len(bsp.positions) - self.size[0])
+        return tree
+    
+    #
+    #   compiles tree of the static objects
+    #
+    def rebuild(self, camera, objects):
+        bsp = self.make_compiler()
+        key = None
+        if self.disk_cache != None:
+            self.profiler.begin("load")
+            key = self.disk_cache.key(bsp, camera, objects)
+            tree = self.disk_cache.load(key, bsp)
+            self.profiler.end(vertices = len(bsp.positions), nodes = bsp.nodes)
+            if tree != None:
+                log.info("Static tree of %d objects is read from the cache", len(objects))
+                self.compiler = bsp
+                self.tree = tree
+                self.size = bsp.size()
+                return
+        
+        log.info("Compile static tree of %d objects", len(objects))
+        #   static tree doesn't depend on the view unless back faces are skipped
+        view = camera if bsp.back_culling else None
+        self.profiler.begin("add")
+        for object in objects:
+            bsp.add(view, object)
+        self.profiler.end(faces = bsp.face_count(), vertices = len(bsp.positions))
+        
+        tree = BSPTree()
+        self.profiler.begin("compile")
+        if bsp.compile(tree) == "NO_FACES":
+            tree = None
+        self.profiler.end(vertices = len(bsp.positions), nodes = bsp.nodes)
+        
+        self.compiler = bsp
+        self.tree = tree
+        self.size = bsp.size()
+        self.rebuilds += 1
+        if key != None and tree != None:
+            self.disk_cache.save(key, bsp, tree)
+        return
+
+#
+#   compiled trees of the static objects kept in the directory
+#   between sessions, file name is the hash of the mesh data,
+#   transforms and compiler settings, files not used for the
+#   longest time are removed first when the size limit is exceeded
+#
+class BSPDiskCache:
+    
+    #   changed when the file layout or the compilation changes
+    version = 2
+    
+    #   arrays of the compiler written to the file
+    buffers = ("positions", "loops", "starts", "totals", "normals", "distances")
+    
+    def __init__(self, directory, max_size = 256 << 20, max_age = 30 * 86400):
+        self.directory = directory
+        #   total size of the files in bytes, 0 is unlimited
+        self.max_size = max_size
+        #   seconds since the last use, 0 is unlimited
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        return
+    
+    #
+    #   content hash of everything the tree depends on
+    #
+    def key(self, bsp, camera, objects):
+        h = hashlib.sha1()
+        settings = (self.version, bsp.splitter, bsp.candidates, bsp.sample_faces, bsp.split_cost,
+                    bsp.convex, bsp.back_culling)
+        h.update(repr(settings).encode())
+        #   static tree is culled when it is drawn, only the tree without
+        #   back faces is made for the camera and culled by its view
+        if bsp.back_culling:
+            h.update(repr((bsp.culling, camera.perspective, camera.width, camera.height)).encode())
+            h.update(numpy.array(camera.view_matrix).tobytes())
+            h.update(numpy.array(camera.proj_matrix).tobytes())
+        for object in objects:
+            if object.mesh == None:
+                continue
+            mesh = object.mesh
+            for array in (object.matrix, mesh.co, mesh.loops, mesh.starts, mesh.totals, mesh.normals):
+                array = numpy.ascontiguousarray(array)
+                h.update(repr((array.dtype.str, array.shape)).encode())
+                h.update(array.tobytes())
+        return h.hexdigest()
+    
+    def path(self, key):
+        return os.path.join(self.directory, "bsp_%s.npz" % key)
+    
+    #
+    #   reads tree into the empty compiler, returns None when
+    #   there is no valid file for the key
+    #
+    def load(self, key, bsp):
+        path = self.path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with numpy.load(path) as data:
+                for name in self.buffers:
+                    getattr(bsp, name).extend(data[name])
+                tree = self.unpack_tree(data["node_front"], data["node_back"], data["node_faces"], data["splitter_faces"])
+                bsp.nodes, bsp.depth, bsp.splits = data["statistics"].tolist()
+                bsp.intersections = dict(((a, b, c), v) for a, b, c, v in data["intersections"].tolist())
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            log.warning("Can't read BSP cache file %s: %s", path, e)
+            bsp.truncate((0, 0, 0))
+            bsp.intersections = {}
+            self.misses += 1
+            return None
+        #   recently used files are removed last, the time is only a
+        #   hint, the directory can be read only or the file removed
+        try:
+            os.utime(path)
+        except OSError as e:
+            log.debug("Can't touch BSP cache file %s: %s", path, e)
+        self.hits += 1
+        return tree
+    
+    #
+    #   writes tree and the compiler arrays, file is renamed when it
+    #   is complete, so other exports never read a partial file
+    #
+    def save(self, key, bsp, tree):
+        path = self.path(key)
+        front, back, faces, splitters = self.pack_tree(tree)
+        arrays = dict((name, getattr(bsp, name).view()) for name in self.buffers)
+        intersections = [edge + (v,) for edge, v in bsp.intersections.items()]
+        try:
+            os.makedirs(self.directory, exist_ok = True)
+            temp = "%s.%d.tmp" % (path, os.getpid())
+            with open(temp, 'wb') as f:
+                numpy.savez_compressed(f, node_front = front, node_back = back, node_faces = faces, splitter_faces = splitters,
+                                       statistics = numpy.array((bsp.nodes, bsp.depth, bsp.splits), dtype=numpy.int64),
+                                       intersections = numpy.array(intersections, dtype=numpy.int64).reshape(-1, 4), **arrays)
+            os.replace(temp, path)
+        except OSError as e:
+            log.warning("Can't write BSP cache file %s: %s", path, e)
+            return
+        log.debug("BSP tree is written to %s", path)
+        self.evict()
+        return
+    
+    #
+    #   removes files not used for too long, than the least recently
+    #   used files until the total size fits the limit
+    #
+    def evict(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if name.startswith("bsp_") and name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        
+        now = time.time()
+        total = sum(size for used, size, path in files)
+        for used, size, path in files:
+            if (self.max_age == 0 or now - used <= self.max_age) and (self.max_size == 0 or total <= self.max_size):
+                break
+            try:
+                os.remove(path)
+                log.debug("BSP cache file %s is removed", path)
+            except OSError as e:
+                log.warning("Can't remove BSP cache file %s: %s", path, e)
+            total -= size
+        return
+    
+    #
+    #   nodes of the tree in depth first order as arrays, children
+    #   are node indices or -1, splitter faces of all nodes follow
+    #   each other
+    #
+    @staticmethod
+    def pack_tree(tree):
+        nodes = []
+        stack = [tree]
+        while len(stack) != 0:
+            node = stack.pop()
+            nodes.append(node)
+            for child in (node.back, node.front):
+                if child != None:
+                    stack.append(child)
+        index = dict((id(node), i) for i, node in enumerate(nodes))
+        front = numpy.array([index[id(node.front)] if node.front != None else -1 for node in nodes], dtype=numpy.int64)
+        back = numpy.array([index[id(node.back)] if node.back != None else -1 for node in nodes], dtype=numpy.int64)
+        faces = numpy.array([len(node.splitter) for node in nodes], dtype=numpy.int64)
+        splitters = numpy.array([face for node in nodes for face in node.splitter], dtype=numpy.int64)
+        return (front, back, faces, splitters)
+    
+    @staticmethod
+    def unpack_tree(front, back, faces, splitters):
+        nodes = [BSPTree() for i in range(len(front))]
+        splitters = splitters.tolist()
+        start = 0
+        for node, f, b, count in zip(nodes, front.tolist(), back.tolist(), faces.tolist()):
+            node.splitter = splitters[start:start + count]
+            start += count
+            node.front = nodes[f] if f >= 0 else None
+            node.back = nodes[b] if b >= 0 else None
+        return nodes[0]
+
+#
+#   measures wall time, element counts and peak memory
+#   of the export stages
+#
+class SVGProfiler:
+
+    def __init__(self, enabled = False, memory = True):
+        self.enabled = enabled
+        #   trace peak memory, tracing slows down measured stages
+        self.memory = memory
+        self.stages = []
+        self.current = None
+        self.start = 0
+        self.tracing = False
+        
+    #
+    #   starts memory tracing
+    #
+    def open(self):
+        if self.enabled and self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        return
+    
+    #
+    #   stops memory tracing if it was started by profiler
+    #
+    def close(self):
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+        return
+    
+    #
+    #   starts stage, stages with the same name are accumulated
+    #
+    def begin(self, name):
+        if not self.enabled:
+            return
+        self.current = self.stage(name)
+        if hasattr(tracemalloc, "reset_peak") and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return
+    
+    #
+    #   finds stage by name, missing stage is created
+    #
+    def stage(self, name):
+        for stage in self.stages:
+            if stage["name"] == name:
+                return stage
+        stage = {"name": name, "calls": 0, "time": 0.0, "faces": 0, "vertices": 0, "nodes": 0, "peak_memory": 0}
+        self.stages.append(stage)
+        return stage
+    
+    #
+    #   adds stages profiled in other process
+    #
+    def merge(self, stages):
+        if not self.enabled:
+            return
+        for other in stages:
+            stage = self.stage(other["name"])
+            for key in ("calls", "time", "faces", "vertices", "nodes"):
+                stage[key] += other[key]
+            stage["peak_memory"] = max(stage["peak_memory"], other["peak_memory"])
+        return
+    
+    #
+    #   finishes current stage
+    #
+    def end(self, faces = 0, vertices = 0, nodes = 0):
+        if not self.enabled or self.current == None:
+            return
+        stage = self.current
+        stage["time"] += time.perf_counter() - self.start
+        stage["calls"] += 1
+        stage["faces"] += faces
+        stage["vertices"] += vertices
+        stage["nodes"] += nodes
+        if tracemalloc.is_tracing():
+            stage["peak_memory"] = max(stage["peak_memory"], tracemalloc.get_traced_memory()[1])
+        self.current = None
+        return
+    
+    #
+    #   prints stages to the console
+    #
+    def report(self):
+        print("%-10s %10s %10s %10s %10s %12s" % ("stage", "time, s", "faces", "vertices", "nodes", "peak, KiB"))
+        for stage in self.stages:
+            print("%-10s %10.3f %10d %10d %10d %12d" % (stage["name"], stage["time"], stage["faces"], stage["vertices"], stage["nodes"], stage["peak_memory"] // 1024))
+        return
+    
+    #
+    #   saves stages to the json file
+    #
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"stages": self.stages}, f, indent = 2)
+        return
+
+class SVGWriter:
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.bsp_compiler = None
+        self.profiler = SVGProfiler(policy.profile != 'NONE')
+        disk_cache = None
+        if policy.bsp_cache_dir != "":
+            disk_cache = BSPDiskCache(policy.bsp_cache_dir, policy.bsp_cache_size << 20, policy.bsp_cache_age * 86400)
+        self.bsp_cache = BSPCache(self.make_compiler, self.profiler, disk_cache)
+        self.file = None
+        
+    #
+    #   opens file and resets state of the document
+    #
+    def open(self, path):
+        if self.policy.compress:
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            self.file = open(path, 'w', encoding='utf-8')
+        #   text waiting to be written to the file
+        self.buffer = []
+        self.buffer_size = 0
+        #   number format of the coordinates
+        self.point_format = "%%.%df,%%.%df " % (self.policy.precision, self.policy.precision)
+        #   path mode writes integer coordinates scaled by the unit
+        self.unit = 10 ** self.policy.precision if self.policy.geometry == 'PATH' else 1
+        #   shapes of the same style packed into a single path
+        self.path = []
+        self.path_style = None
+        self.path_point = (0, 0)
+        #   interned styles, style -> class name
+        self.styles = {}
+        #   style of the open group
+        self.group_style = None
+        return
+    
+    #
+    #   writes rest of the document and closes file
+    #
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.file = None
+        return
+        
+    #
+    #   exports frames and writes profiler report
+    #
+    def export_frames(self, frames):
+        self.profiler.open()
+        if self.policy.processes > 1 and len(frames) > 1:
+            self.export_parallel(frames)
+        else:
+            #   static part of the tree is reused between frames
+            for frame in frames:
+                self.export_file(frame)
+        self.profiler.close()
+        
+        if self.policy.profile == 'CONSOLE':
+            self.profiler.report()
+        elif self.policy.profile == 'JSON':
+            self.profiler.save(os.path.splitext(self.policy.file_path)[0] + ".profile.json")
+    
+        return {'FINISHED'}
+    
+    #
+    #   exports frame to the file
+    #
+    def export_file(self, frame):
+        log.info("Export scene to %s", frame.path)
+        self.open(frame.path)
+        self.export_scene(frame)    
+        self.close()
+        return
+    
+    #
+    #   exports frames in the pool of processes, every process gets
+    #   a contiguous run of frames so its bsp cache stays useful,
+    #   files are written by the workers in the order of frames
+    #
+    def export_parallel(self, frames):
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            log.warning("Processes can't be forked on this platform, export frames sequentially")
+            for frame in frames:
+                self.export_file(frame)
+            return
+        
+        processes = min(self.policy.processes, len(frames))
+        chunk = int(math.ceil(len(frames) / processes))
+        log.info("Export %d frames in %d processes", len(frames), processes)
+        with context.Pool(processes, init_worker, (self.policy,)) as pool:
+            for path, stages in pool.imap(export_job, frames, chunk):
+                log.debug("Exported %s", path)
+                self.profiler.merge(stages)
+        return
+    
+    #
+    #   file path of the frame, camera name and frame number are
+    #   inserted before extension
+    #
+    def frame_path(self, number, camera_name, count):
+        base, ext = os.path.splitext(self.policy.file_path)
+        if count > 1:
+            base += "_" + camera_name
+        if self.policy.animation:
+            base += "_%04d" % number
+        return base + ext
+    
+    #
+    #   creates BSP compiler set up according to the policy
+    #
+    def make_compiler(self):
+        bsp = BSPCompiler()
+        bsp.splitter = self.policy.bsp_splitter
+        bsp.candidates = self.policy.bsp_candidates
+        bsp.convex = self.policy.bsp_convex
+        bsp.culling = self.policy.frustum_culling
+        bsp.back_culling = self.policy.bsp_mode == 'VIEW'
+        bsp.merge = self.policy.merge_coplanar
+        return bsp
+    
+    #
+    #   data exporting goes here
+    #
+    def export_scene(self, frame):
+        self.begin(frame.width, frame.height)
+        
+        #   retrieve camera
+        self.camera = SVGCamera()
+        self.camera.make_camera(frame.camera, frame.width, frame.height)
+        
+        curves = self.project_curves(frame.objects)
+        
+        #   line drawing doesn't need faces to be sorted
+        if self.policy.edge_detection == 'OPT_C':
+            log.info("Export visible lines")
+            self.export_lines(frame.objects)
+            self.export_curves(curves, frame.objects)
+        #   we can build a bsp tree to get correct result in depth sorting
+        elif self.policy.build_bsp:
+            log.info("Export using BSP tree")
+            tree = self.bsp_cache.update(self.camera, frame.objects)
+            bsp = self.bsp_cache.compiler
+            self.bsp_compiler = bsp
+            
+            self.profiler.begin("project")
+            bsp.project(self.camera)
+            self.profiler.end(vertices = len(bsp.screen))
+            
+            self.profiler.begin("write")
+            coverage = self.make_coverage()
+            items = [(curve.position, list(self.curve_primitives([curve]))) for curve in curves]
+            count = self.run_pipeline(bsp.primitives(tree, items), self.make_stages(coverage, bsp))
+            self.profiler.end(faces = count, nodes = bsp.nodes)
+            if coverage != None:
+                log.info("%d occluded faces are skipped", coverage.occluded_count)
+        #   faces of all objects are sorted together
+        elif self.policy.sort_zview and self.policy.sort_mode != 'OBJECT':
+            log.info("Export using depth sort")
+            self.export_sorted(frame.objects, curves)
+        else:
+            log.info("Export using simple method")
+            #   export every object 
+            for object in frame.objects:
+                self.export_object(object)
+            self.export_curves(curves, frame.objects)
+        
+        self.end()
+        return {'FINISHED'}
+        
+        #
+    #   creates xml header, and starts svg tag
+    #    
+    def begin(self, width, height):
+        view_box = ''
+        if self.policy.geometry == 'PATH':
+            view_box = ' viewBox="0 0 %d %d"' % (width * self.unit, height * self.unit)
+        self.write('<?xml version="1.0" standalone="no"?>\n\
+    <!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">\n\
+<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="%f" height="%f"%s>\n' % (width, height, view_box))
+        
+        return {'FINISHED'}
+    
+    #
+    #   close svg tag
+    #
+    def end(self):
+        self.flush_path()
+        if self.group_style != None:
+            self.write('</g>\n')
+            self.group_style = None
+        if len(self.styles) != 0:
+            #   style sheet applies to the whole document
+            rules = []
+            for style, name in sorted(self.styles.items(), key = lambda item: item[1]):
+                rules.append('.%s{%s}\n' % (name, style))
+            self.write('<style type="text/css"><![CDATA[\n%s]]></style>\n' % "".join(rules))
+        self.write('</svg>')
+        return
+    
+    #
+    #   returns style attribute of the element, in 'CLASS' mode
+    #   styles are interned as classes, in 'GROUP' mode runs of
+    #   elements with the same style are wrapped into a group
+    #
+    def style_attribute(self, style):
+        if self.policy.styles == 'CLASS':
+            name = self.styles.get(style)
+            if name == None:
+                name = "s%d" % len(self.styles)
+                self.styles[style] = name
+            return 'class="%s"' % name
+        if self.policy.styles == 'GROUP':
+            if style != self.group_style:
+                if self.group_style != None:
+                    self.write('</g>\n')
+                self.write('<g style="%s">\n' % style)
+                self.group_style = style
+            return ''
+        return 'style="%s"' % style
+    
+    #
+    #   collects text and writes it to the file in large blocks
+    #
+    def write(self, text):
+        self.buffer.append(text)
+        self.buffer_size += len(text)
+        if self.buffer_size >= self.policy.buffer_size:
+            self.flush()
+        return
+    
+    #
+    #   writes collected text to the file
+    #
+    def flush(self):
+        self.file.write("".join(self.buffer))
+        self.buffer = []
+        self.buffer_size = 0
+        return
+    
+    #
+    #   formats all points of the element at once
+    #
+    def points(self, points):
+        p = numpy.asarray(points)[:, :2].ravel().tolist()
+        return (self.point_format * (len(p) // 2)) % tuple(p)
+    
+    #
+    #   makes path data with relative commands from integer
+    #   coordinates, repeated points are dropped
+    #
+    def path_data(self, points, closed):
+        q = numpy.rint(numpy.asarray(points)[:, :2] * self.unit).astype(numpy.int64)
+        d = numpy.diff(q, axis = 0)
+        d = d[(d != 0).any(axis = 1)].ravel().tolist()
+        start = q[0].tolist()
+        text = "m%d %d" % (start[0] - self.path_point[0], start[1] - self.path_point[1])
+        if len(d) != 0:
+            text += "l" + ("%d %d " * (len(d) // 2) % tuple(d))[:-1]
+        if closed:
+            text += "z"
+            self.path_point = start
+        else:
+            self.path_point = q[-1].tolist()
+        return text.replace(" -", "-")
+    
+    #
+    #   writes shape as polygon, polyline or path, shapes painted
+    #   with a single colour are packed into one path because
+    #   painting them one by one gives the same result
+    #
+    def shape(self, points, closed, style, packable):
+        if self.policy.geometry != 'PATH':
+            attribute = self.style_attribute(style)
+            if closed:
+                self.write('<polygon points="%s"\n%s />\n' % (self.points(points), attribute))
+            else:
+                self.write('<polyline points="%s"\n%s />\n' % (self.points(points), attribute))
+            return
+        
+        self.path_shape(lambda: self.path_data(points, closed), style, packable)
+        return
+    
+    #
+    #   writes path data made by the function, data depends on the
+    #   current point, so it is made after the path is chosen
+    #
+    def path_shape(self, data, style, packable):
+        if not packable or style != self.path_style:
+            self.flush_path()
+        if not packable:
+            self.path_point = (0, 0)
+            attribute = self.style_attribute(style)
+            self.write('<path d="%s" %s />\n' % (data(), attribute))
+            return
+        if len(self.path) == 0:
+            self.path_point = (0, 0)
+        self.path_style = style
+        self.path.append(data())
+        return
+    
+    #
+    #   writes splines of cubic segments as one path, coordinates are
+    #   absolute unless geometry is 'PATH'
+    #
+    def curve(self, splines, style, packable):
+        if self.policy.geometry != 'PATH':
+            attribute = self.style_attribute(style)
+            self.write('<path d="%s"\n%s />\n' % ("".join(self.curve_data(points, closed) for points, closed in splines), attribute))
+            return
+        self.path_shape(lambda: "".join(self.curve_path_data(points, closed) for points, closed in splines), style, packable)
+        return
+    
+    #
+    #   absolute path data of the spline
+    #
+    def curve_data(self, points, closed):
+        p = numpy.asarray(points)[:, :2].ravel().tolist()
+        text = "M" + self.point_format % tuple(p[:2]) + "C" + (self.point_format * (len(p) // 2 - 1)) % tuple(p[2:])
+        return text + "Z" if closed else text
+    
+    #
+    #   relative path data of the spline with integer coordinates,
+    #   control points are relative to the start of their segment
+    #
+    def curve_path_data(self, points, closed):
+        q = numpy.rint(numpy.asarray(points)[:, :2] * self.unit).astype(numpy.int64)
+        d = (q[1:].reshape(-1, 3, 2) - q[:-1:3][:, None, :]).ravel().tolist()
+        start = q[0].tolist()
+        text = "m%d %d" % (start[0] - self.path_point[0], start[1] - self.path_point[1])
+        if len(d) != 0:
+            text += "c" + ("%d %d " * (len(d) // 2) % tuple(d))[:-1]
+        if closed:
+            text += "z"
+            self.path_point = start
+        else:
+            self.path_point = q[-1].tolist()
+        return text.replace(" -", "-")
+    
+    #
+    #   writes packed path
+    #
+    def flush_path(self):
+        if len(self.path) != 0:
+            attribute = self.style_attribute(self.path_style)
+            self.write('<path d="%s" %s />\n' % ("".join(self.path), attribute))
+        self.path = []
+        self.path_style = None
+        return
+    
+    #
+    #   ployline
+    #
+    def polyline(self, points):
+        style, packable = self.polyline_style()
+        self.shape(points, False, style, packable)
+        return 
+    
+    #
+    #   ployline
+    #
+    def polygon(self, points, fill_color = (255,255,255), border_color = (0,0,0)):
+        style, packable = self.polygon_style(fill_color, border_color)
+        self.shape(points, True, style, packable)
+        return 
+    
+    #
+    #   style of the polylines and whether they can be packed into a path
+    #
+    def polyline_style(self):
+        return ('fill:none;stroke:black;stroke-width:%f' % (self.policy.line_width * self.unit), True)
+    
+    #
+    #   style of the polygons, polygons painted with a single colour
+    #   can be packed into a path
+    #
+    def polygon_style(self, fill_color, border_color):
+        width = self.policy.line_width * self.unit
+        if self.policy.wireframe:
+            style = 'fill:none;stroke:rgb(%d,%d,%d);stroke-width:%f' % (border_color[0], border_color[1], border_color[2], width)
+            return (style, True)
+        style = 'fill:rgb(%d,%d,%d); stroke:rgb(%d,%d,%d);stroke-width:%f' % (fill_color[0], fill_color[1], fill_color[2], border_color[0], border_color[1], border_color[2], width)
+        return (style, tuple(fill_color) == tuple(border_color))
+    
+    #
+    #   export pipeline, primitives are pulled from the source through
+    #   the stages one at a time, styled and written, every stage is a
+    #   generator taking primitives of the previous one, returns the
+    #   number of written shapes
+    #
+    def run_pipeline(self, primitives, stages = ()):
+        for stage in stages:
+            primitives = stage(primitives)
+        return self.serialize(self.style_stage(primitives))
+    
+    #
+    #   optional stages chosen by the policy, coverage enables
+    #   occlusion culling, bsp compiler joins coplanar faces
+    #
+    def make_stages(self, coverage = None, bsp = None):
+        stages = []
+        if coverage != None:
+            stages.append(lambda primitives: self.cull_stage(primitives, coverage))
+        if bsp != None and bsp.merge:
+            stages.append(bsp.merge_stage)
+        return stages
+    
+    #
+    #   coverage of the frame for occlusion culling, unfilled
+    #   polygons don't hide anything
+    #
+    def make_coverage(self):
+        if not self.policy.occlusion_culling or self.policy.wireframe:
+            return None
+        rounding = 10.0 ** -self.policy.precision
+        if SVGCoverage.sample_spacing(self.policy.line_width, rounding) < 0.25:
+            log.warning("Lines are too thin for occlusion culling")
+            return None
+        return SVGCoverage(self.camera.width, self.camera.height, self.policy.line_width, rounding)
+    
+    #
+    #   drops polygons hidden by the polygons drawn after them, the
+    #   only stage collecting all primitives because coverage is
+    #   tested front to back, polylines are always kept
+    #
+    def cull_stage(self, primitives, coverage):
+        primitives = list(primitives)
+        polygons = [i for i, primitive in enumerate(primitives) if primitive.closed and not primitive.cubic]
+        keep = [not primitive.closed or primitive.cubic for primitive in primitives]
+        for i in coverage.cull([primitives[i].points for i in polygons]):
+            keep[polygons[i]] = True
+        for primitive, visible in zip(primitives, keep):
+            if visible:
+                yield primitive
+        return
+    
+    #
+    #   adds style and packing flag to the primitives
+    #
+    def style_stage(self, primitives):
+        for primitive in primitives:
+            if primitive.closed:
+                style, packable = self.polygon_style(primitive.fill_color, primitive.border_color)
+                #   holes of filled curves are made by the even-odd rule, so
+                #   they can't share a path with other shapes
+                if primitive.cubic and not self.policy.wireframe:
+                    style += ';fill-rule:evenodd'
+                    packable = False
+            else:
+                style, packable = self.polyline_style()
+            yield (primitive.points, primitive.closed, style, packable, primitive.cubic)
+        return
+    
+    #
+    #   last stage, writes styled shapes
+    #
+    def serialize(self, shapes):
+        count = 0
+        for points, closed, style, packable, cubic in shapes:
+            if cubic:
+                self.curve(points, style, packable)
+            else:
+                self.shape(points, closed, style, packable)
+            count += 1
+        return count
+    
+    #
+    #   writes visible parts of silhouettes, borders and creases
+    #
+    def export_lines(self, objects):
+        self.profiler.begin("add")
+        drawing = SVGLineDrawing(self.camera, self.policy.edge_max_value, self.clip_planes())
+        frustum = SVGFrustum(self.camera)
+        for object in objects:
+            if object.mesh != None and self.policy.frustum_culling and \
+               frustum.classify_box(frustum.object_planes(object.matrix), object.mesh.co) == 'OUTSIDE':
+                log.debug("Object %s is outside of the view", object.name)
+            elif object.mesh != None:
+                drawing.add(object)
+            elif object.curve == None:
+                log.warning("Can't export data of object %s", object.name)
+        self.profiler.end(faces = sum(len(t) for t in drawing.triangles), vertices = sum(len(l) for l in drawing.lines))
+        
+        self.profiler.begin("hide")
+        segments = drawing.visible_segments()
+        self.profiler.end(faces = len(segments))
+        
+        self.profiler.begin("write")
+        self.run_pipeline(SVGPrimitive(project_points(self.camera.proj_matrix, segment, self.camera.width, self.camera.height), False)
+                          for segment in segments)
+        self.profiler.end(faces = len(segments))
+        return
+    
+    #
+    #   view space planes faces and lines are clipped by, parts behind
+    #   the eye can't be projected, so planes in front of it are
+    #   always there
+    #
+    def clip_planes(self):
+        frustum = SVGFrustum(self.camera)
+        if self.policy.frustum_culling:
+            return frustum.planes
+        return frustum.near_planes()
+    
+    #
+    #   exports mesh to svg
+    #
+    def export_mesh(self, world_matrix, mesh):
+        self.profiler.begin("add")
+        svg_mesh = SVGMesh(mesh)
+        self.profiler.end(faces = len(svg_mesh.faces), vertices = len(svg_mesh.vertices))
+        
+        self.profiler.begin("project")
+        svg_mesh.project_vertices(self.camera.proj_matrix, self.camera.view_matrix, world_matrix, self.camera.width, self.camera.height,
+                                  self.clip_planes())
+        
+        if self.policy.sort_zview:
+            svg_mesh.sort_faces()
+
+        #   calc front faces only once
+        svg_mesh.calc_front_faces()
+        self.profiler.end(faces = len(svg_mesh.front_faces), vertices = len(svg_mesh.projected_vertices))
+        
+        self.profiler.begin("write")
+        self.run_pipeline(self.mesh_primitives(svg_mesh))
+        self.profiler.end(faces = len(svg_mesh.faces))
+        return
+    
+    #
+    #   pipeline source of the projected mesh according to the policy
+    #
+    def mesh_primitives(self, svg_mesh):        
+        #   according to the edge detection algorithm do
+        if self.policy.edge_detection == 'OPT_A':   #   no edge detection algorithm
+            if self.policy.back_culling:    #   enable back face culling
+                #   use only front faces
+                f = svg_mesh.front_faces
+            else:
+                #   use all faces
+                f = svg_mesh.faces
+            for face in f:
+                for primitive in self.face_primitives(svg_mesh, face):
+                    yield primitive
+        elif self.policy.edge_detection == 'OPT_B': #   use edge detection
+            #   calculate all visible edges
+            edges = svg_mesh.all_edges(self.policy.edge_max_value)  
+            if self.policy.wireframe:   #   wireframe mode
+                if edges != None:
+                    #   draw every visible edge
+                    for e in edges:
+                        yield SVGPrimitive(e, False)
+                else:
+                    log.error("Can't export mesh to svg due to error in edge detection algorithm")
+            else:
+                #   use only front faces
+                for face in svg_mesh.front_faces:
+                    for primitive in self.face_primitives(svg_mesh, face):
+                        yield primitive
+        else:
+            log.error("Edge detection algorithm %s is not supported", self.policy.edge_detection)
+                       
+        return
+    
+    #
+    #   polygon indices of the faces yielded by mesh_primitives
+    #
+    def mesh_faces(self, svg_mesh):
+        if self.policy.edge_detection == 'OPT_A' and not self.policy.back_culling:
+            return numpy.arange(len(svg_mesh.polygons))
+        if self.policy.edge_detection == 'OPT_B' and self.policy.wireframe:
+            return numpy.empty(0, dtype=numpy.int64)
+        return numpy.flatnonzero(svg_mesh.front)
+    
+    #
+    #   polygon of the face of the projected mesh and its visible edges
+    #
+    def face_primitives(self, svg_mesh, face):
+        verts = svg_mesh.polygon_points(face.vertices)
+        if len(verts) == 0:
+            return
+        if self.policy.edge_detection == 'OPT_A':
+            yield SVGPrimitive(verts, True, (255, 255, 255), (0, 0, 0))
+            return
+        #   draw white polygon
+        yield SVGPrimitive(verts, True, (255, 255, 255), (255, 255, 255))
+        #   if face has visible edges than draw them
+        for e in face.visible_edges:
+            if svg_mesh.plane_values is None:
+                yield SVGPrimitive(svg_mesh.projected_vertices[[e[0], e[1]]], False)
+                continue
+            for points in svg_mesh.edge_points([e]):
+                yield SVGPrimitive(points, False)
+        return
+    
+    #
+    #   pipeline source of the faces of several meshes in the given
+    #   order, curves sorted far to near are drawn before the first
+    #   face nearer than them, edges are drawn over the faces
+    #
+    def sorted_primitives(self, depth_sort, order, edges, curves = ()):
+        depths = depth_sort.sorted_depths().tolist() if len(curves) != 0 else []
+        curves = list(curves)
+        for i, (mesh, face) in enumerate(order):
+            while len(curves) != 0 and curves[0].depth > depths[i]:
+                for primitive in self.curve_primitives([curves.pop(0)]):
+                    yield primitive
+            svg_mesh = depth_sort.meshes[mesh]
+            for primitive in self.face_primitives(svg_mesh, svg_mesh.polygons[face]):
+                yield primitive
+        for primitive in self.curve_primitives(curves):
+            yield primitive
+        for e in edges:
+            yield SVGPrimitive(e, False)
+        return
+    
+    #
+    #   exports faces of all objects sorted by depth together, so
+    #   faces of different objects are interleaved
+    #
+    def export_sorted(self, objects, curves = ()):
+        self.profiler.begin("add")
+        objects = [object for object in objects if self.object_in_view(object)]
+        meshes = [SVGMesh(object.mesh) for object in objects]
+        self.profiler.end(faces = sum(len(m.polygons) for m in meshes), vertices = sum(len(m.vertices) for m in meshes))
+        
+        self.profiler.begin("project")
+        planes = self.clip_planes()
+        for object, svg_mesh in zip(objects, meshes):
+            svg_mesh.project_vertices(self.camera.proj_matrix, self.camera.view_matrix, Matrix(object.matrix.tolist()), self.camera.width, self.camera.height, planes)
+            svg_mesh.calc_front_faces()
+        self.profiler.end(faces = sum(len(m.front_faces) for m in meshes), vertices = sum(len(m.projected_vertices) for m in meshes))
+        
+        self.profiler.begin("hide")
+        depth_sort = SVGDepthSort(self.camera.perspective)
+        edges = []
+        for svg_mesh in meshes:
+            if self.policy.edge_detection == 'OPT_B':
+                edges.extend(svg_mesh.all_edges(self.policy.edge_max_value))
+            depth_sort.add(svg_mesh, self.mesh_faces(svg_mesh))
+        order = depth_sort.sort(self.policy.sort_mode == 'NEWELL')
+        self.profiler.end(faces = len(order))
+        if self.policy.sort_mode == 'NEWELL':
+            log.info("%d faces are moved out of distance order by overlap tests", depth_sort.moved_count)
+        
+        self.profiler.begin("write")
+        if not self.policy.wireframe:
+            edges = []
+        coverage = self.make_coverage()
+        self.run_pipeline(self.sorted_primitives(depth_sort, order, edges, curves), self.make_stages(coverage))
+        self.profiler.end(faces = len(order))
+        if coverage != None:
+            log.info("%d occluded faces are skipped", coverage.occluded_count)
+        return
+       
+    #
+    #   projects curve objects in the view, returns the curves sorted
+    #   from far to near
+    #
+    def project_curves(self, objects):
+        objects = [object for object in objects if object.curve != None]
+        if len(objects) == 0:
+            return []
+        
+        self.profiler.begin("project")
+        frustum = SVGFrustum(self.camera)
+        curves = []
+        for object in objects:
+            if self.policy.frustum_culling and \
+               frustum.classify_box(frustum.object_planes(object.matrix), object.curve.co) == 'OUTSIDE':
+                log.debug("Object %s is outside of the view", object.name)
+                continue
+            curve = SVGCurve(object.curve)
+            curve.project(self.camera, object.matrix, self.policy.curve_tolerance)
+            curves.append(curve)
+        curves.sort(key = lambda curve: curve.depth, reverse = True)
+        self.profiler.end(faces = sum(len(curve.splines) for curve in curves), vertices = sum(len(points) for curve in curves for points, cyclic in curve.splines))
+        return curves
+    
+    #
+    #   writes the curves over everything drawn before, faces don't
+    #   hide them, only the BSP tree and the global depth sort draw
+    #   curves among the faces
+    #
+    def export_curves(self, curves, objects):
+        if len(curves) == 0:
+            return
+        if any(object.mesh != None for object in objects):
+            log.warning("Curves are drawn over the faces, use BSP tree or global depth sort to hide them")
+        
+        self.profiler.begin("write")
+        count = self.run_pipeline(self.curve_primitives(curves))
+        self.profiler.end(faces = count)
+        return
+    
+    #
+    #   pipeline source of the curves, closed splines of the filled
+    #   curve make one shape, the rest is stroked
+    #
+    def curve_primitives(self, curves):
+        for curve in curves:
+            splines = curve.splines
+            if curve.curve.filled:
+                closed = [spline for spline in splines if spline[1]]
+                if len(closed) != 0:
+                    yield SVGPrimitive(closed, True, (255, 255, 255), (0, 0, 0), cubic = True)
+                splines = [spline for spline in splines if not spline[1]]
+            if len(splines) != 0:
+                yield SVGPrimitive(splines, False, cubic = True)
+        return
+    
+    #
+    #   exports object
+    #    
+    def export_object(self, object):
+        if self.object_in_view(object):
+            self.export_mesh(Matrix(object.matrix.tolist()), object.mesh)
+        return
+    
+    #
+    #   checks that object has mesh and is not culled by the view
+    #
+    def object_in_view(self, object):
+        if object.mesh == None:
+            if object.curve == None:
+                log.warning("Can't export data of object %s", object.name)
+            return False
+        if self.policy.frustum_culling:
+            frustum = SVGFrustum(self.camera)
+            if frustum.classify_box(frustum.object_planes(object.matrix), object.mesh.co) == 'OUTSIDE':
+                log.debug("Object %s is outside of the view", object.name)
+                return False
+        return True
+    
+#
+#   writer of the worker process
+#
+worker_writer = None
+
+#
+#   creates writer of the worker process
+#
+def init_worker(policy):
+    global worker_writer
+    worker_writer = SVGWriter(policy)
+    worker_writer.profiler.open()
+    return
+
+#
+#   exports frame in the worker process, returns path of the file
+#   and stages profiled since the previous job
+#
+def export_job(frame):
+    worker_writer.export_file(frame)
+    stages = worker_writer.profiler.stages
+    worker_writer.profiler.stages = []
+    return frame.path, stages
+
+#
+#   class contains different option of exporting data
+#
+class SVGExportPolicy:    
+    def __init__(self):
+        #   filepath to export data 
+        self.file_path = ""         
+        #   back culling flag, defaults match the export operator, so
+        #   snapshots are rendered the same way from the command line
+        self.back_culling = True
+        #   direction of the camera
+        self.camera_dir = (0,0,1)
+        #   sorting of faces by z depth value
+        self.sort_zview = True
+        #   depth sort without bsp tree, 'OBJECT' sorts faces of every object,
+        #   'GLOBAL' sorts faces of all objects together, 'NEWELL' also
+        #   reorders overlapping faces by their planes
+        self.sort_mode = 'OBJECT'
+        #   wirefrime mode
+        self.wireframe = False
+        #   line width
+        self.line_width = 1
+        #   edge detection algorithm
+        self.edge_detection = 'OPT_B'
+        #   max value for edge detection algorithm
+        self.edge_max_value = 45.0
+        #   build bsp tree
+        self.build_bsp = True
+        #   bsp splitter selection strategy
+        self.bsp_splitter = 'BALANCED'
+        #   number of candidate splitters to score
+        self.bsp_candidates = 8
+        #   skip bsp partitioning inside convex meshes
+        self.bsp_convex = True
+        #   bsp tree mode, 'STATIC' keeps all faces and is reused across views,
+        #   'VIEW' skips back faces and is rebuilt when the camera moves
+        self.bsp_mode = 'STATIC'
+        #   skip objects and faces outside of the view, clip faces crossing it
+        self.frustum_culling = True
+        #   max distance in pixels between the projected curve and its bezier segments
+        self.curve_tolerance = 0.1
+        #   directory of compiled bsp trees kept between sessions, empty disables it
+        self.bsp_cache_dir = ""
+        #   size limit of the bsp cache directory in MiB and days files are kept unused, 0 is unlimited
+        self.bsp_cache_size = 256
+        self.bsp_cache_age = 30
+        #   skip faces hidden by the faces drawn over them, used with bsp
+        #   tree and depth sort of all objects
+        self.occlusion_culling = False
+        #   join coplanar faces of bsp tree drawn one after other into one polygon
+        self.merge_coplanar = False
+        #   stage profiler output, 'NONE', 'CONSOLE' or 'JSON'
+        self.profile = 'NONE'
+        #   write gzip compressed svgz file
+        self.compress = False
+        #   number of characters collected before writing to the file
+        self.buffer_size = 1 << 20
+        #   number of decimal digits of the coordinates
+        self.precision = 3
+        #   geometry elements, 'POLYGON' or 'PATH'
+        self.geometry = 'POLYGON'
+        #   style output, 'INLINE', 'CLASS' or 'GROUP'
+        self.styles = 'CLASS'
+        #   export every frame of the scene frame range
+        self.animation = False
+        #   cameras to export from, 'ACTIVE' or 'SELECTED'
+        self.cameras = 'ACTIVE'
+        #   number of processes exporting frames
+        self.processes = 1
+        #   write scene snapshot next to the svg file
+        self.snapshot = False
+
+#
+#   concatenates arrays of all meshes, works for no arrays too
+#
+def concatenate(arrays, shape, dtype):
+    return numpy.concatenate([numpy.empty(shape, dtype=dtype)] + [numpy.asarray(a, dtype=dtype) for a in arrays])
+
+#
+#   splits concatenated array back by the numbers of elements
+#
+def split(array, counts):
+    return numpy.split(array, numpy.cumsum(counts)[:-1]) if len(counts) != 0 else []
+
+#
+#   writes frames to the compressed .npz snapshot, meshes shared
+#   by the frames are written once, arrays of all meshes are
+#   concatenated and split by the numbers of their elements
+#
+def save_snapshot(path, frames):
+    meshes = []
+    curves = []
+    index = {}
+    objects = []
+    for number, frame in enumerate(frames):
+        for object in frame.objects:
+            mesh = -1
+            if object.mesh != None:
+                if id(object.mesh) not in index:
+                    index[id(object.mesh)] = len(meshes)
+                    meshes.append(object.mesh)
+                mesh = index[id(object.mesh)]
+            curve = -1
+            if object.curve != None:
+                if id(object.curve) not in index:
+                    index[id(object.curve)] = len(curves)
+                    curves.append(object.curve)
+                curve = index[id(object.curve)]
+            objects.append((number, object, mesh, curve))
+
+    cameras = [frame.camera for frame in frames]
+    numpy.savez_compressed(path,
+        frame = numpy.array([frame.frame for frame in frames], dtype=numpy.int64),
+        resolution = concatenate([[(frame.width, frame.height)] for frame in frames], (0, 2), numpy.int64),
+        camera_name = numpy.array([camera.name for camera in cameras], dtype=str),
+        camera_type = numpy.array([camera.type for camera in cameras], dtype=str),
+        camera_lens = concatenate([[(camera.angle_x, camera.clip_start, camera.clip_end, camera.ortho_scale)] for camera in cameras], (0, 4), numpy.float64),
+        camera_matrix = concatenate([[camera.matrix] for camera in cameras], (0, 4, 4), numpy.float64),
+        object_frame = numpy.array([number for number, object, mesh, curve in objects], dtype=numpy.int64),
+        object_name = numpy.array([object.name for number, object, mesh, curve in objects], dtype=str),
+        object_matrix = concatenate([[object.matrix] for number, object, mesh, curve in objects], (0, 4, 4), numpy.float64),
+        object_mesh = numpy.array([mesh for number, object, mesh, curve in objects], dtype=numpy.int64),
+        mesh_name = numpy.array([mesh.name for mesh in meshes], dtype=str),
+        mesh_vertices = numpy.array([len(mesh.co) for mesh in meshes], dtype=numpy.int64),
+        mesh_loops = numpy.array([len(mesh.loops) for mesh in meshes], dtype=numpy.int64),
+        mesh_polygons = numpy.array([len(mesh.starts) for mesh in meshes], dtype=numpy.int64),
+        mesh_edges = numpy.array([len(mesh.edges) for mesh in meshes], dtype=numpy.int64),
+        #   coordinates come from float32 blender data
+        co = concatenate([mesh.co for mesh in meshes], (0, 3), numpy.float32),
+        loops = concatenate([mesh.loops for mesh in meshes], (0,), numpy.int32),
+        starts = concatenate([mesh.starts for mesh in meshes], (0,), numpy.int32),
+        totals = concatenate([mesh.totals for mesh in meshes], (0,), numpy.int32),
+        normals = concatenate([mesh.normals for mesh in meshes], (0, 3), numpy.float32),
+        edges = concatenate([mesh.edges for mesh in meshes], (0, 2), numpy.int32),
+        object_curve = numpy.array([curve for number, object, mesh, curve in objects], dtype=numpy.int64),
+        curve_name = numpy.array([curve.name for curve in curves], dtype=str),
+        curve_splines = numpy.array([len(curve.counts) for curve in curves], dtype=numpy.int64),
+        curve_points = numpy.array([len(curve.co) for curve in curves], dtype=numpy.int64),
+        curve_filled = numpy.array([curve.filled for curve in curves], dtype=bool),
+        curve_co = concatenate([curve.co for curve in curves], (0, 3), numpy.float32),
+        spline_counts = concatenate([curve.counts for curve in curves], (0,), numpy.int64),
+        spline_cyclic = concatenate([curve.cyclic for curve in curves], (0,), bool))
+    log.info("Snapshot of %d frames and %d meshes written to %s", len(frames), len(meshes), path)
+    return
+
+#
+#   reads frames from the snapshot, paths of the frames are empty
+#
+def load_snapshot(path):
+    with numpy.load(path) as data:
+        co = split(data["co"], data["mesh_vertices"])
+        loops = split(data["loops"], data["mesh_loops"])
+        starts = split(data["starts"], data["mesh_polygons"])
+        totals = split(data["totals"], data["mesh_polygons"])
+        normals = split(data["normals"], data["mesh_polygons"])
+        edges = split(data["edges"], data["mesh_edges"])
+        meshes = []
+        for i, name in enumerate(data["mesh_name"].tolist()):
+            meshes.append(SVGMeshData(name, co[i].astype(numpy.float64), loops[i], starts[i], totals[i],
+                                      normals[i].astype(numpy.float64), edges[i]))
+
+        #   snapshots written before curves were exported have no curves
+        curves = []
+        object_curve = [-1] * len(data["object_name"])
+        if "curve_name" in data:
+            curve_co = split(data["curve_co"], data["curve_points"])
+            counts = split(data["spline_counts"], data["curve_splines"])
+            cyclic = split(data["spline_cyclic"], data["curve_splines"])
+            for i, name in enumerate(data["curve_name"].tolist()):
+                curves.append(SVGCurveData(name, curve_co[i].astype(numpy.float64), counts[i], cyclic[i],
+                                           bool(data["curve_filled"][i])))
+            object_curve = data["object_curve"].tolist()
+
+        objects = [[] for frame in data["frame"]]
+        for number, name, matrix, mesh, curve in zip(data["object_frame"].tolist(), data["object_name"].tolist(),
+                                                     data["object_matrix"], data["object_mesh"].tolist(), object_curve):
+            objects[number].append(SVGObjectData(name, matrix, meshes[mesh] if mesh >= 0 else None,
+                                                 curves[curve] if curve >= 0 else None))
+
+        frames = []
+        for i, number in enumerate(data["frame"].tolist()):
+            angle_x, clip_start, clip_end, ortho_scale = data["camera_lens"][i].tolist()
+            camera = SVGCameraData(str(data["camera_name"][i]), str(data["camera_type"][i]),
+                                   angle_x, clip_start, clip_end, ortho_scale, data["camera_matrix"][i])
+            width, height = data["resolution"][i].tolist()
+            frames.append(SVGFrameData(number, "", width, height, camera, objects[i]))
+    log.info("Snapshot of %d frames and %d meshes read from %s", len(frames), len(meshes), path)
+    return frames
+
+#
+#   renders snapshot from the command line
+#
+def main(argv = None):
+    policy = SVGExportPolicy()
+    parser = argparse.ArgumentParser(description = "Render scene snapshot written by the SVG exporter")
+    parser.add_argument("snapshot", help = "scene snapshot, .npz file")
+    parser.add_argument("output", help = "svg file, camera name and frame number are inserted when snapshot has several")
+    parser.add_argument("--no-bsp", dest = "build_bsp", action = "store_false", help = "export objects one by one without BSP tree")
+    parser.add_argument("--splitter", choices = ("FIRST", "BALANCED"), default = policy.bsp_splitter, help = "BSP splitter selection")
+    parser.add_argument("--candidates", type = int, default = policy.bsp_candidates, help = "number of candidate splitters to score")
+    parser.add_argument("--bsp-cache", dest = "bsp_cache_dir", default = policy.bsp_cache_dir, help = "directory of compiled BSP trees kept between runs")
+    parser.add_argument("--bsp-cache-size", type = int, default = policy.bsp_cache_size, help = "size limit of BSP cache directory, MiB, 0 is unlimited")
+    parser.add_argument("--bsp-cache-age", type = int, default = policy.bsp_cache_age, help = "days unused BSP cache files are kept, 0 is unlimited")
+    parser.add_argument("--bsp-mode", choices = ("STATIC", "VIEW"), default = policy.bsp_mode, help = "keep back faces in BSP tree or cull them for the current view")
+    parser.add_argument("--no-convex", dest = "convex", action = "store_false", help = "partition convex meshes face by face")
+    parser.add_argument("--no-culling", dest = "culling", action = "store_false", help = "don't cull and clip faces by the view")
+    parser.add_argument("--occlusion", action = "store_true", help = "skip faces hidden by the faces in front of them")
+    parser.add_argument("--merge", action = "store_true", help = "join coplanar faces drawn one after other")
+    parser.add_argument("--no-back-culling", dest = "back_culling", action = "store_false", help = "keep faces oriented backward the camera")
+    parser.add_argument("--no-zsort", dest = "zsort", action = "store_false", help = "don't sort faces by depth")
+    parser.add_argument("--sort-mode", choices = ("OBJECT", "GLOBAL", "NEWELL"), default = policy.sort_mode, help = "depth sort of faces without BSP tree")
+    parser.add_argument("--wireframe", action = "store_true", help = "export polygons as polylines")
+    parser.add_argument("--line-width", type = float, default = policy.line_width, help = "width of the lines")
+    parser.add_argument("--edge-detection", choices = ("OPT_A", "OPT_B", "OPT_C"), default = policy.edge_detection, help = "edge detection algorithm")
+    parser.add_argument("--edge-max-value", type = float, default = policy.edge_max_value, help = "max angle between faces of the edge, degrees")
+    parser.add_argument("--curve-tolerance", type = float, default = policy.curve_tolerance, help = "max distance between projected curves and their bezier segments, pixels")
+    parser.add_argument("--precision", type = int, default = policy.precision, help = "number of decimal digits of the coordinates")
+    parser.add_argument("--geometry", choices = ("POLYGON", "PATH"), default = policy.geometry, help = "geometry elements")
+    parser.add_argument("--styles", choices = ("INLINE", "CLASS", "GROUP"), default = policy.styles, help = "style output")
+    parser.add_argument("--compress", action = "store_true", help = "write gzip compressed svgz files")
+    parser.add_argument("--processes", type = int, default = policy.processes, help = "number of processes exporting frames")
+    parser.add_argument("--profile", choices = ("NONE", "CONSOLE", "JSON"), default = policy.profile, help = "stage profiler output")
+    parser.add_argument("--log-level", choices = ("WARNING", "INFO", "DEBUG"), default = "WARNING", help = "log level")
+    args = parser.parse_args(argv)
+
+    log.setLevel(args.log_level)
+    if len(log.handlers) == 0:
+        log.addHandler(logging.StreamHandler())
+
+    policy.file_path = args.output
+    policy.build_bsp = args.build_bsp
+    policy.bsp_splitter = args.splitter
+    policy.bsp_candidates = args.candidates
+    policy.bsp_convex = args.convex
+    policy.bsp_mode = args.bsp_mode
+    policy.bsp_cache_dir = args.bsp_cache_dir
+    policy.bsp_cache_size = args.bsp_cache_size
+    policy.bsp_cache_age = args.bsp_cache_age
+    policy.frustum_culling = args.culling
+    policy.occlusion_culling = args.occlusion
+    policy.merge_coplanar = args.merge
+    policy.back_culling = args.back_culling
+    policy.sort_zview = args.zsort
+    policy.sort_mode = args.sort_mode
+    policy.wireframe = args.wireframe
+    policy.line_width = args.line_width
+    policy.edge_detection = args.edge_detection
+    policy.edge_max_value = args.edge_max_value
+    policy.precision = args.precision
+    policy.curve_tolerance = args.curve_tolerance
+    policy.geometry = args.geometry
+    policy.styles = args.styles
+    policy.compress = args.compress
+    policy.processes = args.processes
+    policy.profile = args.profile
+    if policy.compress and not policy.file_path.endswith(".svgz"):
+        policy.file_path = os.path.splitext(policy.file_path)[0] + ".svgz"
+
+    frames = load_snapshot(args.snapshot)
+    if len(frames) == 0:
+        log.error("Snapshot %s has no frames", args.snapshot)
+        return 1
+
+    #   names of the files are made the same way as in blender
+    writer = SVGWriter(policy)
+    policy.animation = len(set(frame.frame for frame in frames)) > 1
+    cameras = len(set(frame.camera.name for frame in frames))
+    for frame in frames:
+        frame.path = writer.frame_path(frame.frame, frame.camera.name, cameras)
+    writer.export_frames(frames)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   the repository root is the blender add-on package, its __init__
+#   imports bpy, pytest imports __init__ of every package it collects,
+#   so the root is collected as a plain directory
+#
+
+import pytest
+
+class AddonRoot:
+
+    @pytest.hookimpl(tryfirst = True)
+    def pytest_collect_directory(self, path, parent):
+        if path == parent.config.rootpath:
+            return pytest.Dir.from_parent(parent, path = path)
+        return None
+
+def pytest_configure(config):
+    config.pluginmanager.register(AddonRoot(), "addon_root")
+    return
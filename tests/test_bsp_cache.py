@@ -0,0 +1,189 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   tests of the BSP trees kept on disk between sessions, the
+#   engine runs against the mathutils stand-in of the benchmarks:
+#
+#       python -m pytest
+#       python -m unittest discover tests
+#
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "bench"))
+sys.path.insert(1, os.path.dirname(TESTS_DIR))
+
+import numpy
+
+import bench
+from engine import SVGExportPolicy, SVGWriter, SVGCameraData, SVGObjectData, SVGFrameData
+
+class BSPDiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = os.path.join(self.directory, "cache")
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        return
+
+    #
+    #   exports the building with a new writer, so only the disk
+    #   cache is shared with the previous exports, returns the
+    #   writer and the written file
+    #
+    def export(self, offset = 0.0, mode = 'STATIC'):
+        objects, matrix = bench.building_scene()
+        matrix[0, 3] += offset
+        policy = SVGExportPolicy()
+        policy.file_path = os.path.join(self.directory, "building.svg")
+        policy.bsp_cache_dir = self.cache
+        policy.bsp_mode = mode
+        camera = SVGCameraData("Camera", 'PERSP', 0.8575, 0.1, 500.0, 7.0, matrix)
+        writer = SVGWriter(policy)
+        writer.export_file(SVGFrameData(1, policy.file_path, 800, 600, camera, objects))
+        with open(policy.file_path) as f:
+            return writer, f.read()
+
+    def cache_files(self):
+        return [name for name in os.listdir(self.cache) if name.endswith(".npz")]
+
+    def test_warm_cache_gives_same_file(self):
+        writer, cold = self.export()
+        self.assertEqual(writer.bsp_cache.rebuilds, 1)
+        self.assertEqual(writer.bsp_cache.disk_cache.misses, 1)
+        self.assertEqual(len(self.cache_files()), 1)
+
+        writer, warm = self.export()
+        self.assertEqual(writer.bsp_cache.rebuilds, 0)
+        self.assertEqual(writer.bsp_cache.disk_cache.hits, 1)
+        self.assertEqual(warm, cold)
+        return
+
+    def test_static_tree_is_shared_by_cameras(self):
+        self.export()
+        writer, moved = self.export(offset = 0.5)
+        self.assertEqual(writer.bsp_cache.rebuilds, 0)
+        self.assertEqual(writer.bsp_cache.disk_cache.hits, 1)
+        self.assertEqual(len(self.cache_files()), 1)
+        return
+
+    def test_view_tree_depends_on_camera(self):
+        self.export(mode = 'VIEW')
+        writer, moved = self.export(offset = 0.5, mode = 'VIEW')
+        self.assertEqual(writer.bsp_cache.rebuilds, 1)
+        self.assertEqual(len(self.cache_files()), 2)
+        return
+
+    def test_corrupt_file_is_compiled_again(self):
+        writer, cold = self.export()
+        path = os.path.join(self.cache, self.cache_files()[0])
+        with open(path, 'wb') as f:
+            f.write(b"not a tree")
+
+        writer, fallback = self.export()
+        self.assertEqual(writer.bsp_cache.rebuilds, 1)
+        self.assertEqual(writer.bsp_cache.disk_cache.misses, 1)
+        self.assertEqual(fallback, cold)
+
+        #   the file is written again
+        writer, warm = self.export()
+        self.assertEqual(writer.bsp_cache.disk_cache.hits, 1)
+        self.assertEqual(warm, cold)
+        return
+
+    def test_touch_failure_keeps_hit(self):
+        writer, cold = self.export()
+        utime = os.utime
+        def fail(path, *args, **kwargs):
+            raise PermissionError(13, "Permission denied", path)
+        os.utime = fail
+        try:
+            writer, warm = self.export()
+        finally:
+            os.utime = utime
+        self.assertEqual(writer.bsp_cache.disk_cache.hits, 1)
+        self.assertEqual(warm, cold)
+        return
+
+    def test_truncated_file_is_compiled_again(self):
+        writer, cold = self.export()
+        path = os.path.join(self.cache, self.cache_files()[0])
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+
+        writer, fallback = self.export()
+        self.assertEqual(writer.bsp_cache.rebuilds, 1)
+        self.assertEqual(fallback, cold)
+        return
+
+class BSPCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        return
+
+    #
+    #   same loops split into a quad and a triangle or into a triangle
+    #   and a quad
+    #
+    def mesh(self, totals):
+        co = [(0, 0, 0), (1, 0, 0), (2, 0, 1), (2, 1, 1), (1, 1, 0), (0, 1, 0)]
+        loops = [0, 1, 2, 3, 4, 5, 0]
+        polygons = [loops[:totals[0]], loops[totals[0]:]]
+        return bench.make_mesh("Mesh", co, polygons)
+
+    def frame(self, number, mesh):
+        path = os.path.join(self.directory, "frame%d.svg" % number)
+        camera = SVGCameraData("Camera", 'PERSP', 0.8575, 0.1, 500.0, 7.0, bench.look_at((1, -3, 4), (1, 0.5, 0.5)))
+        return SVGFrameData(number, path, 800, 600, camera, [SVGObjectData("Object", numpy.identity(4), mesh)])
+
+    def export(self, writer, frame):
+        writer.export_file(frame)
+        with open(frame.path) as f:
+            return f.read()
+
+    def test_split_polygons_change_tree(self):
+        first, second = self.mesh((4, 3)), self.mesh((3, 4))
+        self.assertNotEqual(first.signature, second.signature)
+
+        policy = SVGExportPolicy()
+        policy.file_path = os.path.join(self.directory, "frame.svg")
+        writer = SVGWriter(policy)
+        self.export(writer, self.frame(1, first))
+        changed = self.export(writer, self.frame(2, second))
+        self.assertEqual(writer.bsp_cache.dynamic, set(["Object"]))
+        fresh = self.export(SVGWriter(policy), self.frame(2, second))
+        self.assertEqual(changed, fresh)
+        return
+
+if __name__ == "__main__":
+    unittest.main()
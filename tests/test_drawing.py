@@ -0,0 +1,223 @@
+#  ***** GPL LICENSE BLOCK *****
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#  All rights reserved.
+#  ***** GPL LICENSE BLOCK *****
+
+#
+#   tests of the drawing stages on small scenes with known results,
+#   clipping, occlusion culling, depth sorting and the BSP splits
+#   and merges, run them as the other tests:
+#
+#       python -m pytest
+#       python -m unittest discover tests
+#
+
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "bench"))
+sys.path.insert(1, os.path.dirname(TESTS_DIR))
+
+import numpy
+
+import bench
+from engine import (BSPCompiler, SVGCamera, SVGCameraData, SVGCoverage, SVGDepthSort, SVGMesh,
+                    SVGPrimitive, clip_polygon, clip_segments, clip_triangles, plane_values)
+
+#
+#   camera of the tests, identity matrix looks from the origin along -z
+#
+def make_camera(matrix = None):
+    if matrix is None:
+        matrix = numpy.identity(4)
+    camera = SVGCamera()
+    camera.make_camera(SVGCameraData("Camera", 'PERSP', 0.8575, 0.1, 100.0, 7.0, matrix), 800, 600)
+    return camera
+
+#
+#   area of the polygon by its x and y coordinates
+#
+def area(points):
+    x = points[:, 0]
+    y = points[:, 1]
+    return abs(numpy.dot(x, numpy.roll(y, -1)) - numpy.dot(y, numpy.roll(x, -1))) / 2.0
+
+class ClippingTest(unittest.TestCase):
+
+    #   near plane at z = -1, inside is z <= -1
+    planes = numpy.array([(0.0, 0.0, -1.0, -1.0)])
+
+    def values(self, points):
+        return plane_values(self.planes, points.reshape(-1, 3)).reshape(points.shape[:-1] + (len(self.planes),))
+
+    def test_polygon_crossing_plane(self):
+        points = numpy.array([(0.0, 0.0, 0.0), (0.0, 0.0, -2.0), (1.0, 0.0, -2.0)])
+        clipped = clip_polygon(points, self.values(points))
+        expected = [(0.0, 0.0, -1.0), (0.0, 0.0, -2.0), (1.0, 0.0, -2.0), (0.5, 0.0, -1.0)]
+        numpy.testing.assert_allclose(clipped, expected)
+        return
+
+    def test_polygon_behind_plane(self):
+        points = numpy.array([(0.0, 0.0, 0.0), (1.0, 0.0, -0.5), (0.0, 1.0, -0.5)])
+        self.assertEqual(clip_polygon(points, self.values(points)).shape, (0, 3))
+        return
+
+    def test_triangles(self):
+        triangles = numpy.array([[(0.0, 0.0, -2.0), (1.0, 0.0, -2.0), (0.0, 1.0, -2.0)],     #   inside
+                                 [(0.0, 0.0, 0.0), (0.0, 0.0, -2.0), (1.0, 0.0, -2.0)],      #   crossing
+                                 [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0)]])       #   behind
+        clipped = clip_triangles(triangles, self.values(triangles))
+        expected = [triangles[0],
+                    [(0.0, 0.0, -1.0), (0.0, 0.0, -2.0), (1.0, 0.0, -2.0)],
+                    [(0.0, 0.0, -1.0), (1.0, 0.0, -2.0), (0.5, 0.0, -1.0)]]
+        numpy.testing.assert_allclose(clipped, expected)
+        return
+
+    def test_segments(self):
+        segments = numpy.array([[(0.0, 0.0, 0.0), (0.0, 2.0, -2.0)],
+                                [(0.0, 2.0, -2.0), (0.0, 0.0, 0.0)],
+                                [(0.0, 0.0, -3.0), (1.0, 0.0, -3.0)],
+                                [(0.0, 0.0, 0.0), (1.0, 0.0, -0.5)]])
+        clipped = clip_segments(segments, self.values(segments))
+        expected = [[(0.0, 1.0, -1.0), (0.0, 2.0, -2.0)],
+                    [(0.0, 2.0, -2.0), (0.0, 1.0, -1.0)],
+                    segments[2]]
+        numpy.testing.assert_allclose(clipped, expected)
+        return
+
+class CoverageTest(unittest.TestCase):
+
+    def square(self, low, high):
+        return numpy.array([(low, low, 1.0), (high, low, 1.0), (high, high, 1.0), (low, high, 1.0)])
+
+    def test_occluded_quad_is_dropped(self):
+        coverage = SVGCoverage(100, 100, 1.0)
+        #   polygons are in drawing order, the big one is drawn over the small one
+        visible = coverage.cull([self.square(40.0, 60.0), self.square(10.0, 90.0)])
+        self.assertEqual(visible, [1])
+        self.assertEqual(coverage.occluded_count, 1)
+        return
+
+    def test_partly_covered_quad_is_kept(self):
+        coverage = SVGCoverage(100, 100, 1.0)
+        visible = coverage.cull([self.square(80.0, 95.0), self.square(10.0, 90.0)])
+        self.assertEqual(visible, [0, 1])
+        self.assertEqual(coverage.occluded_count, 0)
+        return
+
+    def test_stroke_of_hidden_quad_shows(self):
+        coverage = SVGCoverage(100, 100, 1.0)
+        #   border of the back quad is closer than the stroke width to the edge of the front one
+        visible = coverage.cull([self.square(40.0, 89.8), self.square(10.0, 90.0)])
+        self.assertEqual(visible, [0, 1])
+        return
+
+class DepthSortTest(unittest.TestCase):
+
+    #
+    #   long face A leaning away from the camera and small face B
+    #   under it, centre of A is farther than centre of B, but B
+    #   is behind the plane of A, so it is drawn first
+    #
+    def test_newell_moves_face_behind_plane(self):
+        co = [(-1.0, -1.0, -2.0), (1.0, -1.0, -2.0), (1.0, 1.0, -60.0), (-1.0, 1.0, -60.0),
+              (-0.5, -0.9, -20.0), (0.5, -0.9, -20.0), (0.5, -0.5, -20.0), (-0.5, -0.5, -20.0)]
+        mesh = SVGMesh(bench.make_mesh("DepthSort", co, [(0, 1, 2, 3), (4, 5, 6, 7)]))
+        camera = make_camera()
+        mesh.project_vertices(camera.proj_matrix, camera.view_matrix, numpy.identity(4), camera.width, camera.height)
+
+        depth_sort = SVGDepthSort()
+        depth_sort.add(mesh, [0, 1])
+        self.assertEqual(depth_sort.sort(), [(0, 0), (0, 1)])
+        self.assertEqual(depth_sort.sort(refine = True), [(0, 1), (0, 0)])
+        self.assertEqual(depth_sort.moved_count, 1)
+        return
+
+    def test_separate_faces_keep_distance_order(self):
+        co = [(-3.0, -1.0, -10.0), (-2.0, -1.0, -10.0), (-2.0, 1.0, -10.0), (-3.0, 1.0, -10.0),
+              (2.0, -1.0, -5.0), (3.0, -1.0, -5.0), (3.0, 1.0, -5.0), (2.0, 1.0, -5.0)]
+        mesh = SVGMesh(bench.make_mesh("Separate", co, [(0, 1, 2, 3), (4, 5, 6, 7)]))
+        camera = make_camera()
+        mesh.project_vertices(camera.proj_matrix, camera.view_matrix, numpy.identity(4), camera.width, camera.height)
+
+        depth_sort = SVGDepthSort()
+        depth_sort.add(mesh, [0, 1])
+        self.assertEqual(depth_sort.sort(refine = True), [(0, 0), (0, 1)])
+        self.assertEqual(depth_sort.moved_count, 0)
+        return
+
+class BSPCompilerTest(unittest.TestCase):
+
+    #
+    #   adds faces with their own vertices, faces are
+    #   lists of points, returns indices of the faces
+    #
+    def add_faces(self, compiler, faces):
+        first = len(compiler.positions)
+        compiler.positions.extend(numpy.array([p for face in faces for p in face], dtype=numpy.float64))
+        totals = numpy.array([len(face) for face in faces], dtype=numpy.int64)
+        loops = numpy.arange(first, first + int(totals.sum()), dtype=numpy.int64)
+        points = [numpy.array(face, dtype=numpy.float64) for face in faces]
+        normals = numpy.array([numpy.cross(p[1] - p[0], p[2] - p[0]) for p in points])
+        normals /= numpy.linalg.norm(normals, axis = 1)[:, None]
+        distances = numpy.array([-numpy.dot(n, p[0]) for n, p in zip(normals, points)])
+        return compiler.add_faces(loops, totals, normals, distances)
+
+    def test_coplanar_quads_merge(self):
+        compiler = BSPCompiler()
+        #   quads share the edge at x = 1 by position only, third face stands on them
+        faces = self.add_faces(compiler, [[(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)],
+                                          [(1, 0, 0), (2, 0, 0), (2, 1, 0), (1, 1, 0)],
+                                          [(0, 0, 0), (2, 0, 0), (2, 0, 1), (0, 0, 1)]])
+        compiler.project(make_camera(bench.look_at((1.0, -3.0, 4.0), (1.0, 0.5, 0.0))))
+
+        primitives = [SVGPrimitive(compiler.make_polygon(face), True, (255, 255, 255), (0, 0, 0), face) for face in faces]
+        merged = list(compiler.merge_stage(primitives))
+        self.assertEqual(len(merged), 2)
+        #   collinear vertices of the joined edge are dropped
+        self.assertEqual(len(merged[0].points), 4)
+        self.assertAlmostEqual(area(merged[0].points), area(primitives[0].points) + area(primitives[1].points))
+        self.assertIs(merged[1], primitives[2])
+        return
+
+    def test_split_shares_edge_vertex(self):
+        compiler = BSPCompiler()
+        #   plane x = 0 splits both quads across their common edge
+        splitter, low, high = self.add_faces(compiler, [[(0, 0, 0), (0, 1, 0), (0, 1, 1)],
+                                                        [(-1, -1, 0), (1, -1, 0), (1, 0, 0), (-1, 0, 0)],
+                                                        [(-1, 0, 0), (1, 0, 0), (1, 1, 0), (-1, 1, 0)]])
+        #   the quads use the same vertices on the common edge
+        compiler.loops.data[compiler.starts.data[high]] = compiler.face_vertices(low)[3]
+        compiler.loops.data[compiler.starts.data[high] + 1] = compiler.face_vertices(low)[2]
+        count = len(compiler.positions)
+
+        parts = compiler.split(splitter, low) + compiler.split(splitter, high)
+        #   two points on the outer edges and one on the common edge
+        self.assertEqual(len(compiler.positions), count + 3)
+        vertices = [set(compiler.face_vertices(part).tolist()) for part in parts]
+        shared = vertices[0] & vertices[1] & vertices[2] & vertices[3]
+        self.assertEqual(len(shared), 1)
+        numpy.testing.assert_allclose(compiler.positions.data[shared.pop()], (0.0, 0.0, 0.0))
+        #   front parts are on the positive side of the splitter
+        for part in (parts[0], parts[2]):
+            self.assertTrue((compiler.positions.data[compiler.face_vertices(part)][:, 0] >= 0).all())
+        for part in (parts[1], parts[3]):
+            self.assertTrue((compiler.positions.data[compiler.face_vertices(part)][:, 0] <= 0).all())
+        return
+
+if __name__ == "__main__":
+    unittest.main()